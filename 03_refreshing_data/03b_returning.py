@@ -0,0 +1,72 @@
+from sqlmodel import Field, Session, SQLModel, create_engine, insert, update
+
+
+class Hero(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str
+    secret_name: str
+    age: int | None = None
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+engine = create_engine(sqlite_url, echo=True)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+
+def create_heroes():
+    hero_1 = Hero(name="Deadpond", secret_name="Dive Wilson")
+    hero_2 = Hero(name="Spider-Boy", secret_name="Pedro Parqueador")
+
+    with Session(engine) as session:
+        session.add(hero_1)
+        session.add(hero_2)
+
+        # flush() sends the INSERTs without committing, the ids come back with them
+        session.flush()
+
+        # the attributes are still loaded, no SELECT is needed to read them
+        print("After flushing the session")
+        print("Hero 1:", hero_1)
+        print("Hero 2:", hero_2)
+
+        session.commit()
+
+
+def create_and_update_with_returning():
+    with Session(engine) as session:
+        # INSERT ... RETURNING gives back the generated values of the new row
+        # in the same statement (SQLite 3.35+)
+        statement = (
+            insert(Hero)
+            .values(name="Rusty-Man", secret_name="Tommy Sharp", age=48)
+            .returning(Hero.id, Hero.name, Hero.age)
+        )
+        hero = session.exec(statement).one()
+        print("Inserted hero:", hero)
+
+        # the same for UPDATE ... RETURNING, the new values without a SELECT
+        statement = (
+            update(Hero)
+            .where(Hero.id == hero.id)
+            .values(age=Hero.age + 1)
+            .returning(Hero.id, Hero.name, Hero.age)
+        )
+        hero = session.exec(statement).one()
+        print("Updated hero:", hero)
+
+        session.commit()
+
+
+def main():
+    create_db_and_tables()
+    create_heroes()
+    create_and_update_with_returning()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from sqlmodel import Field, Session, SQLModel, create_engine, func, select
+
+
+class Hero(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    secret_name: str
+    age: int | None = Field(default=None, index=True)
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+engine = create_engine(sqlite_url, echo=True)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+
+def create_heroes():
+    hero_1 = Hero(name="Deadpond", secret_name="Dive Wilson")
+    hero_2 = Hero(name="Spider-Boy", secret_name="Pedro Parqueador")
+    hero_3 = Hero(name="Rusty-Man", secret_name="Tommy Sharp", age=48)
+    hero_4 = Hero(name="Tarantula", secret_name="Natalia Roman-on", age=32)
+    hero_5 = Hero(name="Black Lion", secret_name="Trevor Challa", age=35)
+    hero_6 = Hero(name="Dr. Weird", secret_name="Steve Weird", age=36)
+    hero_7 = Hero(name="Captain North America", secret_name="Esteban Rogelios", age=93)
+
+    with Session(engine) as session:
+        session.add(hero_1)
+        session.add(hero_2)
+        session.add(hero_3)
+        session.add(hero_4)
+        session.add(hero_5)
+        session.add(hero_6)
+        session.add(hero_7)
+
+        session.commit()
+
+
+def aggregate_heroes():
+    with Session(engine) as session:
+        # instead of selecting every hero and counting in a for loop,
+        # the database computes the numbers and sends back a single row
+        # count(age) skips the heroes without an age, count() counts every row
+        statement = select(
+            func.count(),
+            func.count(Hero.age),
+            func.min(Hero.age),
+            func.max(Hero.age),
+            func.avg(Hero.age),
+        )
+        count, with_age, youngest, oldest, average = session.exec(statement).one()
+        print("Heroes:", count, "with an age:", with_age)
+        print("Ages from", youngest, "to", oldest, "average", average)
+
+
+def group_heroes_by_age():
+    with Session(engine) as session:
+        # one row per group, here the heroes of each decade
+        # // is an integer division, 48 // 10 * 10 is 40
+        decade = Hero.age // 10 * 10
+        statement = (
+            select(decade, func.count())
+            .where(Hero.age != None)  # noqa: E711
+            .group_by(decade)
+            .order_by(decade)
+        )
+        results = session.exec(statement)
+        for start, count in results:
+            print(f"{start}-{start + 9} years:", count)
+
+
+def main():
+    create_db_and_tables()
+    create_heroes()
+    aggregate_heroes()
+    group_heroes_by_age()
+
+
+if __name__ == "__main__":
+    main()
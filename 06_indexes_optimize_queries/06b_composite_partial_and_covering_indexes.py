@@ -0,0 +1,69 @@
+from sqlalchemy import Index, text
+from sqlmodel import Field, Session, SQLModel, create_engine
+
+
+class Team(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str
+    headquarters: str
+
+
+class Hero(SQLModel, table=True):
+    # Field(index=True) only indexes one column, the indexes over several
+    # columns (or only some rows) are declared in __table_args__
+    __table_args__ = (
+        # composite: the heroes of a team ordered by name, one index for both
+        # the WHERE and the ORDER BY
+        Index("ix_hero_team_id_name", "team_id", "name"),
+        # partial: only the heroes with an age are in it, a smaller index for
+        # the queries that skip the others anyway
+        Index("ix_hero_age_known", "age", sqlite_where=text("age IS NOT NULL")),
+        # unique: two heroes can't share a secret name in the same team
+        Index("ux_hero_team_id_secret_name", "team_id", "secret_name", unique=True),
+        # covering: holds every column the query reads, the table itself is
+        # never read (SQLite has no INCLUDE, the extra columns go at the end)
+        Index("ix_hero_name_age", "name", "age"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    name: str  # ix_hero_name_age also serves the lookups by name alone
+    secret_name: str
+    age: int | None = Field(default=None)
+
+    # foreign keys are not indexed on their own, index=True does it
+    # (here ix_hero_team_id_name already starts with it)
+    team_id: int | None = Field(default=None, foreign_key="team.id")
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+engine = create_engine(sqlite_url, echo=True)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+
+def show_query_plans():
+    queries = [
+        "SELECT * FROM hero WHERE team_id = 1 ORDER BY name",
+        "SELECT * FROM hero WHERE age > 30",
+        "SELECT name, age FROM hero WHERE name = 'Deadpond'",
+    ]
+    with Session(engine) as session:
+        for query in queries:
+            # EXPLAIN QUERY PLAN shows which index SQLite picks for the query
+            plan = session.exec(text(f"EXPLAIN QUERY PLAN {query}")).all()
+            print(query)
+            for row in plan:
+                print("   ", row.detail)
+
+
+def main():
+    create_db_and_tables()
+    show_query_plans()
+
+
+if __name__ == "__main__":
+    main()
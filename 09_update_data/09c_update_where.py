@@ -0,0 +1,82 @@
+from sqlmodel import Field, Session, SQLModel, create_engine, delete, select, update
+
+
+class Hero(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    secret_name: str
+    age: int | None = Field(default=None, index=True)
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+engine = create_engine(sqlite_url, echo=True)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+
+def create_heroes():
+    hero_1 = Hero(name="Deadpond", secret_name="Dive Wilson")
+    hero_2 = Hero(name="Spider-Boy", secret_name="Pedro Parqueador")
+    hero_3 = Hero(name="Rusty-Man", secret_name="Tommy Sharp", age=48)
+    hero_4 = Hero(name="Tarantula", secret_name="Natalia Roman-on", age=32)
+    hero_5 = Hero(name="Black Lion", secret_name="Trevor Challa", age=35)
+    hero_6 = Hero(name="Dr. Weird", secret_name="Steve Weird", age=36)
+    hero_7 = Hero(name="Captain North America", secret_name="Esteban Rogelios", age=93)
+
+    with Session(engine) as session:
+        session.add(hero_1)
+        session.add(hero_2)
+        session.add(hero_3)
+        session.add(hero_4)
+        session.add(hero_5)
+        session.add(hero_6)
+        session.add(hero_7)
+
+        session.commit()
+
+
+def update_heroes():
+    with Session(engine) as session:
+        # instead of selecting each hero, changing it and committing,
+        # send a single UPDATE for every hero matching the WHERE clause
+        # The database changes the rows without sending them to Python,
+        # so it's one statement whether it matches 2 heroes or 100 000
+        statement = update(Hero).where(Hero.age >= 35).values(age=Hero.age + 1)
+        # "evaluate" also updates the heroes already loaded in this session,
+        # "fetch" asks the database which rows changed, False skips it
+        results = session.exec(
+            statement, execution_options={"synchronize_session": "evaluate"}
+        )
+        print("Updated heroes:", results.rowcount)
+
+        session.commit()
+
+        statement = select(Hero).where(Hero.age >= 35)
+        results = session.exec(statement)
+        for hero in results:
+            print("Hero:", hero)
+
+
+def delete_heroes():
+    with Session(engine) as session:
+        # the same for DELETE, a single statement and the number of deleted rows
+        statement = delete(Hero).where(Hero.age == None)  # noqa: E711
+        results = session.exec(statement)
+        print("Deleted heroes:", results.rowcount)
+
+        session.commit()
+
+
+def main():
+    create_db_and_tables()
+    create_heroes()
+    update_heroes()
+    delete_heroes()
+
+
+if __name__ == "__main__":
+    main()
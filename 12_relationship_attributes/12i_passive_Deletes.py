@@ -1,4 +1,5 @@
-from sqlmodel import Field, Relationship, Session, SQLModel, create_engine, select, text
+from sqlalchemy import event
+from sqlmodel import Field, Relationship, Session, SQLModel, create_engine, select
 
 
 class Team(SQLModel, table=True):
@@ -33,10 +34,17 @@ sqlite_url = f"sqlite:///{sqlite_file_name}"
 engine = create_engine(sqlite_url, echo=True)
 
 
+# SQLite only enforces foreign keys (and their ondelete) on the connections
+# that ask for it, so ask on every new connection of the engine's pool
+@event.listens_for(engine, "connect")
+def enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
-    with engine.connect() as connection:
-        connection.execute(text("PRAGMA foreign_keys=ON"))  # for SQLite only
 
 
 def create_heroes():
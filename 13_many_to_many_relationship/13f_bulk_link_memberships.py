@@ -0,0 +1,212 @@
+from collections.abc import Iterable
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import (
+    Field,
+    Relationship,
+    Session,
+    SQLModel,
+    create_engine,
+    delete,
+    select,
+)
+
+
+class HeroTeamLink(SQLModel, table=True):
+    team_id: int | None = Field(default=None, foreign_key="team.id", primary_key=True)
+    hero_id: int | None = Field(default=None, foreign_key="hero.id", primary_key=True)
+
+
+class Team(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    headquarters: str
+
+    heroes: list["Hero"] = Relationship(back_populates="teams", link_model=HeroTeamLink)
+
+
+class Hero(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(index=True)
+    secret_name: str
+    age: int | None = Field(default=None, index=True)
+
+    teams: list[Team] = Relationship(back_populates="heroes", link_model=HeroTeamLink)
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+engine = create_engine(sqlite_url, echo=True)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+
+
+def create_heroes():
+    with Session(engine) as session:
+        team_preventers = Team(name="Preventers", headquarters="Sharp Tower")
+        team_z_force = Team(name="Z-Force", headquarters="Sister Margaret's Bar")
+
+        hero_deadpond = Hero(
+            name="Deadpond",
+            secret_name="Dive Wilson",
+            teams=[team_z_force, team_preventers],
+        )
+        hero_rusty_man = Hero(
+            name="Rusty-Man",
+            secret_name="Tommy Sharp",
+            age=48,
+            teams=[team_preventers],
+        )
+        hero_spider_boy = Hero(
+            name="Spider-Boy", secret_name="Pedro Parqueador", teams=[team_preventers]
+        )
+        session.add(hero_deadpond)
+        session.add(hero_rusty_man)
+        session.add(hero_spider_boy)
+        session.commit()
+
+        session.refresh(hero_deadpond)
+        session.refresh(hero_rusty_man)
+        session.refresh(hero_spider_boy)
+
+        print("Deadpond:", hero_deadpond)
+        print("Deadpond teams:", hero_deadpond.teams)
+        print("Rusty-Man:", hero_rusty_man)
+        print("Rusty-Man Teams:", hero_rusty_man.teams)
+        print("Spider-Boy:", hero_spider_boy)
+        print("Spider-Boy Teams:", hero_spider_boy.teams)
+
+
+# (team_id, hero_id) pairs per statement, 2 parameters each, well below
+# SQLite's limit of bound parameters
+CHUNK_SIZE = 1000
+
+
+def add_memberships(session: Session, pairs: Iterable[tuple[int, int]]) -> int:
+    """
+    Link many heroes and teams with INSERTs straight into HeroTeamLink
+
+    `team.heroes.append(hero)` loads every hero of the team first, this doesn't
+    load either side. Pairs that are already linked, or repeated, are skipped
+    (ON CONFLICT DO NOTHING, like INSERT OR IGNORE but only for the primary key).
+    Returns the number of new links.
+    """
+    # a repeated pair is linked (or unlinked) once
+    pairs = list(dict.fromkeys(pairs))
+    statement = insert(HeroTeamLink).on_conflict_do_nothing()
+    connection = session.connection()
+    count = 0
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        result = connection.execute(
+            statement,
+            [
+                {"team_id": team_id, "hero_id": hero_id}
+                for team_id, hero_id in pairs[start : start + CHUNK_SIZE]
+            ],
+        )
+        count += result.rowcount
+    sync_loaded_collections(session, pairs, added=True)
+    return count
+
+
+def remove_memberships(session: Session, pairs: Iterable[tuple[int, int]]) -> int:
+    """
+    Unlink many heroes and teams with DELETE ... WHERE (team_id, hero_id) IN (...)
+
+    Returns the number of removed links.
+    """
+    # a repeated pair is linked (or unlinked) once
+    pairs = list(dict.fromkeys(pairs))
+    connection = session.connection()
+    count = 0
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        statement = delete(HeroTeamLink).where(
+            tuple_(HeroTeamLink.team_id, HeroTeamLink.hero_id).in_(
+                pairs[start : start + CHUNK_SIZE]
+            )
+        )
+        count += connection.execute(statement).rowcount
+    sync_loaded_collections(session, pairs, added=False)
+    return count
+
+
+def sync_loaded_collections(
+    session: Session, pairs: list[tuple[int, int]], added: bool
+):
+    """
+    Update the team.heroes and hero.teams lists already loaded in the session
+
+    Collections that were never loaded are left alone, they will be loaded
+    with the new links when accessed. A loaded collection gaining an object
+    that isn't in the session is expired instead, to be loaded again.
+    """
+    # models are not hashable, they are grouped by their id() instead
+    changes = {}
+    for team_id, hero_id in pairs:
+        team = session.identity_map.get(session.identity_key(Team, team_id))
+        hero = session.identity_map.get(session.identity_key(Hero, hero_id))
+        for obj, attribute, other in ((team, "heroes", hero), (hero, "teams", team)):
+            # a collection that is loaded is in the instance __dict__
+            if obj is not None and attribute in obj.__dict__:
+                others = changes.setdefault((id(obj), attribute), (obj, {}))[1]
+                others.setdefault(id(other), other)
+
+    for (_, attribute), (obj, others) in changes.items():
+        current = obj.__dict__[attribute]
+        if added:
+            if any(other is None for other in others.values()):
+                session.expire(obj, [attribute])
+                continue
+            linked = {id(other) for other in current}
+            new = current + [other for key, other in others.items() if key not in linked]
+        else:
+            new = [other for other in current if id(other) not in others]
+        # replace the list with what is in the database, without pending changes
+        set_committed_value(obj, attribute, new)
+
+
+def update_heroes():
+    with Session(engine) as session:
+        hero_spider_boy = session.exec(
+            select(Hero).where(Hero.name == "Spider-Boy")
+        ).one()
+        team_z_force = session.exec(select(Team).where(Team.name == "Z-Force")).one()
+        team_preventers = session.exec(
+            select(Team).where(Team.name == "Preventers")
+        ).one()
+        # this collection is loaded, it's kept up to date below
+        print("Spider-Boy's teams:", hero_spider_boy.teams)
+
+        added = add_memberships(
+            session,
+            [
+                (team_z_force.id, hero_spider_boy.id),
+                (team_z_force.id, hero_spider_boy.id),
+                (team_preventers.id, hero_spider_boy.id),
+            ],
+        )
+        # Spider-Boy was already in the Preventers, Z-Force is added once
+        print("Added links:", added)
+        print("Updated Spider-Boy's teams:", hero_spider_boy.teams)
+
+        removed = remove_memberships(session, [(team_z_force.id, hero_spider_boy.id)])
+        print("Removed links:", removed)
+        print("Reverted Spider-Boy's teams:", hero_spider_boy.teams)
+        session.commit()
+
+        print("Z-Force heroes:", team_z_force.heroes)
+
+
+def main():
+    create_db_and_tables()
+    create_heroes()
+    update_heroes()
+
+
+if __name__ == "__main__":
+    main()
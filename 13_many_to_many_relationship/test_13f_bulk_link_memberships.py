@@ -0,0 +1,112 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import registry
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+
+def load_lesson():
+    """
+    Import the lesson, its name starts with a digit so it can't be imported
+    with an import statement
+
+    Its models are declared in a registry of their own: other lessons declare
+    hero and team tables on SQLModel.metadata too, and the whole suite runs
+    in one process.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "bulk_link_memberships", Path(__file__).parent / "13f_bulk_link_memberships.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    default_registry = SQLModel._sa_registry
+    lesson_registry = registry()
+    SQLModel._sa_registry, SQLModel.metadata = lesson_registry, lesson_registry.metadata
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        SQLModel._sa_registry, SQLModel.metadata = default_registry, default_registry.metadata
+    return module
+
+
+lesson = load_lesson()
+
+Hero, Team, HeroTeamLink = lesson.Hero, lesson.Team, lesson.HeroTeamLink
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    HeroTeamLink.__table__.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Team(id=1, name="Preventers", headquarters="Sharp Tower"),
+                Team(id=2, name="Z-Force", headquarters="Sister Margaret's Bar"),
+                Hero(id=1, name="Deadpond", secret_name="Dive Wilson"),
+                Hero(id=2, name="Rusty-Man", secret_name="Tommy Sharp"),
+                Hero(id=3, name="Spider-Boy", secret_name="Pedro Parqueador"),
+            ]
+        )
+        session.commit()
+        session.expunge_all()
+        yield session
+    engine.dispose()
+
+
+def links(session: Session) -> list[tuple[int, int]]:
+    statement = select(HeroTeamLink.team_id, HeroTeamLink.hero_id)
+    return sorted(session.exec(statement).all())
+
+
+def test_add_memberships_skips_duplicates(session: Session, monkeypatch):
+    assert lesson.add_memberships(session, [(1, 1), (1, 1), (1, 2), (2, 1)]) == 3
+    monkeypatch.setattr(lesson, "CHUNK_SIZE", 1)
+    assert lesson.add_memberships(session, [(1, 1), (2, 2)]) == 1
+    assert links(session) == [(1, 1), (1, 2), (2, 1), (2, 2)]
+
+
+def test_add_memberships_syncs_loaded_collections(session: Session):
+    team = session.get(Team, 1)
+    hero = session.get(Hero, 1)
+    other_team = session.get(Team, 2)
+    assert team.heroes == hero.teams == other_team.heroes == []
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        lesson.add_memberships(session, [(1, 1), (1, 1), (2, 3)])
+        # in sync on both sides, each hero once
+        assert team.heroes == [hero]
+        assert hero.teams == [team]
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert len(statements) == 1
+    # hero 3 isn't in the session, the collection is loaded again
+    assert "heroes" not in other_team.__dict__
+    assert [hero.id for hero in other_team.heroes] == [3]
+    assert session.get(Hero, 2).teams == []
+
+
+def test_remove_memberships(session: Session):
+    lesson.add_memberships(session, [(1, 1), (1, 2), (2, 1)])
+    team = session.get(Team, 1)
+    hero = session.get(Hero, 1)
+    assert len(team.heroes) == 2 and len(hero.teams) == 2
+
+    assert lesson.remove_memberships(session, [(1, 1), (1, 1), (9, 9)]) == 1
+
+    assert links(session) == [(1, 2), (2, 1)]
+    assert [hero.id for hero in team.heroes] == [2]
+    assert [team.id for team in hero.teams] == [2]
+    # the lists are replaced as committed values, there is nothing to flush
+    assert not session.dirty
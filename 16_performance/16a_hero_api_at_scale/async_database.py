@@ -0,0 +1,44 @@
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import (
+    ENGINE_PROFILE,
+    SQL_ECHO,
+    get_profile,
+    init_connections,
+    query_metrics,
+    sql_log,
+)
+from .models import AppModel
+
+sqlite_file_name = "database.db"
+# aiosqlite runs each sqlite3 connection in its own thread and awaits the results
+sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+
+
+def make_async_engine(
+    url: str = sqlite_url, profile: str = ENGINE_PROFILE, **kwargs
+) -> AsyncEngine:
+    """Like make_engine(), for an async engine, with the same PROFILES"""
+    settings = get_profile(profile)
+    engine = create_async_engine(url, **{"echo": SQL_ECHO, **settings["pool"], **kwargs})
+    # connection events are registered on the sync engine wrapped by the async one
+    init_connections(engine.sync_engine, settings)
+    return engine
+
+
+engine = make_async_engine()
+sql_log.attach(engine.sync_engine)
+query_metrics.attach(engine.sync_engine)
+
+
+async def create_db_and_tables():
+    async with engine.begin() as connection:
+        await connection.run_sync(AppModel.metadata.create_all)
+
+
+async def get_session():
+    # expire_on_commit=False: after a commit, reading an expired attribute
+    # would need a lazy load, which can't run outside of an await
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
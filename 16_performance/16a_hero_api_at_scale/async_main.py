@@ -0,0 +1,152 @@
+from fastapi import Depends, FastAPI, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .async_database import create_db_and_tables, get_session
+from .bulk import delete_cascading
+from .loading import eager_load
+from .models import (
+    Hero,
+    HeroCreate,
+    HeroPublic,
+    HeroPublicWithTeam,
+    HeroUpdate,
+    Team,
+    TeamCreate,
+    TeamPublic,
+    TeamPublicWithHeroes,
+    TeamUpdate,
+)
+from .projection import select_public
+
+# Same API as main.py, but the handlers await the database instead of
+# holding a threadpool worker while SQLite works.
+# Lazy loading can't happen in async code, every relationship in a response
+# is loaded up front with eager_load().
+app = FastAPI()
+
+
+async def commit(session: AsyncSession):
+    """Commit, a write the database refuses (e.g. a team_id of no team) is a 422"""
+    try:
+        await session.commit()
+    except IntegrityError as exc:
+        await session.rollback()
+        raise HTTPException(status_code=422, detail=f"Rejected by the database: {exc.orig}")
+
+
+@app.on_event("startup")
+async def on_startup():
+    await create_db_and_tables()
+
+
+@app.post("/heroes/", response_model=HeroPublic)
+async def create_hero(*, session: AsyncSession = Depends(get_session), hero: HeroCreate):
+    db_hero = Hero.model_validate(hero)
+    session.add(db_hero)
+    # get_session() doesn't expire the objects on commit, there's nothing to refresh
+    await commit(session)
+    return db_hero
+
+
+@app.get("/heroes/", response_model=list[HeroPublic])
+async def read_heroes(
+    *,
+    session: AsyncSession = Depends(get_session),
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=100),
+):
+    statement = (
+        select_public(Hero, HeroPublic).order_by(Hero.id).offset(offset).limit(limit)
+    )
+    heroes = (await session.exec(statement)).all()
+    return [hero._asdict() for hero in heroes]
+
+
+@app.get("/heroes/{hero_id}", response_model=HeroPublicWithTeam)
+async def read_hero(*, session: AsyncSession = Depends(get_session), hero_id: int):
+    hero = await session.get(Hero, hero_id, options=eager_load(Hero, HeroPublicWithTeam))
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    return hero
+
+
+@app.patch("/heroes/{hero_id}", response_model=HeroPublic)
+async def update_hero(
+    *, session: AsyncSession = Depends(get_session), hero_id: int, hero: HeroUpdate
+):
+    db_hero = await session.get(Hero, hero_id)
+    if not db_hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    hero_data = hero.model_dump(exclude_unset=True)
+    db_hero.sqlmodel_update(hero_data)
+    session.add(db_hero)
+    await commit(session)
+    return db_hero
+
+
+@app.delete("/heroes/{hero_id}")
+async def delete_hero(*, session: AsyncSession = Depends(get_session), hero_id: int):
+    hero = await session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    await session.delete(hero)
+    await session.commit()
+    return {"ok": True}
+
+
+@app.post("/teams/", response_model=TeamPublic)
+async def create_team(*, session: AsyncSession = Depends(get_session), team: TeamCreate):
+    db_team = Team.model_validate(team)
+    session.add(db_team)
+    await session.commit()
+    return db_team
+
+
+@app.get("/teams/", response_model=list[TeamPublic])
+async def read_teams(
+    *,
+    session: AsyncSession = Depends(get_session),
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=100),
+):
+    statement = (
+        select_public(Team, TeamPublic).order_by(Team.id).offset(offset).limit(limit)
+    )
+    teams = (await session.exec(statement)).all()
+    return [team._asdict() for team in teams]
+
+
+@app.get("/teams/{team_id}", response_model=TeamPublicWithHeroes)
+async def read_team(*, team_id: int, session: AsyncSession = Depends(get_session)):
+    team = await session.get(Team, team_id, options=eager_load(Team, TeamPublicWithHeroes))
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    return team
+
+
+@app.patch("/teams/{team_id}", response_model=TeamPublic)
+async def update_team(
+    *,
+    session: AsyncSession = Depends(get_session),
+    team_id: int,
+    team: TeamUpdate,
+):
+    db_team = await session.get(Team, team_id)
+    if not db_team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    team_data = team.model_dump(exclude_unset=True)
+    db_team.sqlmodel_update(team_data)
+    session.add(db_team)
+    await session.commit()
+    return db_team
+
+
+@app.delete("/teams/{team_id}")
+async def delete_team(*, session: AsyncSession = Depends(get_session), team_id: int):
+    team = await session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    await session.run_sync(delete_cascading, team)
+    await session.commit()
+    return {"ok": True}
@@ -0,0 +1,178 @@
+"""
+Requests/second and p99 latency of sync versus async handlers (AsyncSession)
+at different numbers of concurrent clients
+
+Both apps serve GET /heroes/{hero_id} and GET /heroes/ with the handlers of
+async_main.py, or sync copies of them doing the same queries, and no
+middleware, so only the session type differs. main.py does more per request
+(metrics, keyset pagination, X-Total-Count) and isn't compared here.
+The apps are called in process through httpx's ASGI transport, so the numbers
+leave out the network and the server but keep the threadpool (sync handlers)
+and the event loop (async handlers) of a real deployment.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_async_load 5000
+"""
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Query
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import async_database, async_main, database
+from ..bulk import bulk_insert
+from ..loading import eager_load
+from ..models import AppModel, Hero, HeroPublic, HeroPublicWithTeam, Team
+from ..projection import select_public
+
+CONCURRENCY_LEVELS = (50, 200, 1000)
+HERO_COUNT = 10_000
+# as many connections as the threadpool running the sync handlers has threads
+POOL_SIZE = 40
+# The sync session dependency keeps its connection until its teardown after the
+# response, under enough load all the workers are busy waiting for a
+# connection instead, until the pool times out. Fail those requests quickly,
+# they are reported as errors.
+POOL_TIMEOUT = 5
+
+
+def read_hero(*, session: Session = Depends(database.get_session), hero_id: int):
+    hero = session.get(Hero, hero_id, options=eager_load(Hero, HeroPublicWithTeam))
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    return hero
+
+
+def read_heroes(
+    *,
+    session: Session = Depends(database.get_session),
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=100),
+):
+    statement = (
+        select_public(Hero, HeroPublic).order_by(Hero.id).offset(offset).limit(limit)
+    )
+    return [hero._asdict() for hero in session.exec(statement)]
+
+
+def make_app(read_hero, read_heroes) -> FastAPI:
+    """An app with only the two routes of the load, without any middleware"""
+    app = FastAPI()
+    app.add_api_route("/heroes/", read_heroes, response_model=list[HeroPublic])
+    app.add_api_route("/heroes/{hero_id}", read_hero, response_model=HeroPublicWithTeam)
+    return app
+
+
+sync_app = make_app(read_hero, read_heroes)
+async_app = make_app(async_main.read_hero, async_main.read_heroes)
+
+
+async def run_load(
+    app, concurrency: int, total_requests: int
+) -> tuple[float, float, int]:
+    latencies = []
+    errors = 0
+    # errors (e.g. pool timeouts) become 500 responses instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        async def client_loop(requests: int):
+            nonlocal errors
+            for _ in range(requests):
+                if random.random() < 0.8:
+                    url = f"/heroes/{random.randint(1, HERO_COUNT)}"
+                else:
+                    url = f"/heroes/?offset={random.randint(0, HERO_COUNT - 20)}&limit=20"
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                errors += response.is_error
+
+        # every client sends at least one request, more clients than requests
+        # would measure nothing
+        requests = max(total_requests // concurrency, 1)
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(requests) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    return len(latencies) / elapsed, p99 * 1000, errors
+
+
+def seed(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    AppModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        team_ids = bulk_insert(
+            session,
+            Team,
+            ({"name": f"Team {i}", "headquarters": "Somewhere"} for i in range(100)),
+            return_ids=True,
+        )
+        bulk_insert(
+            session,
+            Hero,
+            (
+                {
+                    "name": f"Hero {i}",
+                    "secret_name": f"Secret {i}",
+                    "age": i % 100,
+                    "team_id": team_ids[i % 100],
+                }
+                for i in range(HERO_COUNT)
+            ),
+        )
+        session.commit()
+    engine.dispose()
+
+
+def main():
+    total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "bench.db"
+        seed(path)
+
+        sync_engine = create_engine(
+            f"sqlite:///{path}",
+            connect_args={"check_same_thread": False},
+            pool_size=POOL_SIZE,
+            pool_timeout=POOL_TIMEOUT,
+        )
+        async_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{path}", pool_size=POOL_SIZE, pool_timeout=POOL_TIMEOUT
+        )
+
+        def get_sync_session():
+            with Session(sync_engine) as session:
+                yield session
+
+        async def get_async_session():
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                yield session
+
+        sync_app.dependency_overrides[database.get_session] = get_sync_session
+        async_app.dependency_overrides[async_database.get_session] = get_async_session
+
+        async def run_levels():
+            # a single event loop, pooled aiosqlite connections belong to the loop
+            # that opened them
+            print(f"{'clients':>8} {'app':>6} {'req/s':>10} {'p99 ms':>10} {'errors':>7}")
+            for concurrency in CONCURRENCY_LEVELS:
+                for name, app in (("sync", sync_app), ("async", async_app)):
+                    rps, p99, errors = await run_load(app, concurrency, total_requests)
+                    print(f"{concurrency:>8} {name:>6} {rps:>10,.0f} {p99:>10.1f} {errors:>7}")
+            await async_engine.dispose()
+
+        asyncio.run(run_levels())
+        sync_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Updating N heroes with N calls to PATCH /heroes/{id} versus one PATCH /heroes/
+
+The handlers are called directly, without HTTP, to compare the database work.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_batch_update 5000
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session
+
+from ..bulk import bulk_insert
+from ..database import make_engine
+from ..main import update_hero, update_heroes
+from ..models import AppModel, Hero, HeroBatchUpdate, HeroUpdate
+
+HERO_COUNT = 50_000
+
+
+def changes(count: int) -> list[dict]:
+    """A mix of roster changes: ages, team moves and renames"""
+    random.seed(42)
+    rows = []
+    for i in range(count):
+        hero_id = random.randint(1, HERO_COUNT)
+        kind = i % 3
+        if kind == 0:
+            rows.append({"id": hero_id, "age": i % 100})
+        elif kind == 1:
+            rows.append({"id": hero_id, "team_id": None})
+        else:
+            rows.append({"id": hero_id, "name": f"Renamed {i}", "age": i % 100})
+    return rows
+
+
+def loop_single(engine, rows: list[dict]):
+    for row in rows:
+        row = dict(row)
+        hero_id = row.pop("id")
+        with Session(engine) as session:
+            update_hero(session=session, hero_id=hero_id, hero=HeroUpdate(**row))
+
+
+def batch(engine, rows: list[dict]):
+    with Session(engine) as session:
+        update_heroes(session=session, heroes=[HeroBatchUpdate(**row) for row in rows])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rows = changes(count)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}"}
+                    for i in range(HERO_COUNT)
+                ),
+            )
+            session.commit()
+
+        print(f"{count:,} updates")
+        for name, run in (("single", loop_single), ("batch", batch)):
+            start = time.perf_counter()
+            run(engine, rows)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8} {elapsed:>8.2f} s {count / elapsed:>12,.0f} rows/s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
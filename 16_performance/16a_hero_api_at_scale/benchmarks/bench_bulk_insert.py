@@ -0,0 +1,78 @@
+"""
+Rows/second of the per-object `session.add()` loop used by the tutorial
+`create_heroes()` functions versus `bulk_insert()`
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_bulk_insert 100000
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, create_engine
+
+from ..bulk import bulk_insert
+from ..models import AppModel, Hero
+
+
+def make_heroes(count: int):
+    for i in range(count):
+        yield Hero(name=f"Hero {i}", secret_name=f"Secret {i}", age=i % 100)
+
+
+def insert_with_session_add(engine, count: int):
+    with Session(engine) as session:
+        for hero in make_heroes(count):
+            session.add(hero)
+        session.commit()
+
+
+def insert_with_bulk_insert(engine, count: int):
+    with Session(engine) as session:
+        bulk_insert(session, Hero, make_heroes(count))
+        session.commit()
+
+
+def insert_with_bulk_insert_returning_ids(engine, count: int):
+    with Session(engine) as session:
+        bulk_insert(session, Hero, make_heroes(count), return_ids=True)
+        session.commit()
+
+
+def insert_dicts_with_bulk_insert(engine, count: int):
+    rows = (
+        {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+        for i in range(count)
+    )
+    with Session(engine) as session:
+        bulk_insert(session, Hero, rows)
+        session.commit()
+
+
+def run(function, count: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'bench.db'}")
+        AppModel.metadata.create_all(engine)
+        start = time.perf_counter()
+        function(engine, count)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return count / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for function in (
+        insert_with_session_add,
+        insert_with_bulk_insert,
+        insert_with_bulk_insert_returning_ids,
+        insert_dicts_with_bulk_insert,
+    ):
+        rows_per_second = run(function, count)
+        print(f"{function.__name__:<40} {rows_per_second:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cost of the X-Total-Count of GET /heroes/ as the table grows: `SELECT count(*)`
+versus the row_count counter maintained by triggers, and what the triggers
+add to bulk inserts
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_counts 1000000
+"""
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, func, select
+
+from ..bulk import bulk_insert
+from ..counts import total_rows
+from ..database import make_engine
+from ..models import AppModel, Hero
+
+RUNS = 20
+
+
+def median_ms(engine, count) -> float:
+    timings = []
+    with Session(engine) as session:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            count(session)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def insert_rate(engine, start: int, count: int) -> float:
+    """Heroes inserted per second"""
+    begin = time.perf_counter()
+    with Session(engine) as session:
+        bulk_insert(
+            session,
+            Hero,
+            (
+                {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                for i in range(start, start + count)
+            ),
+        )
+        session.commit()
+    return count / (time.perf_counter() - begin)
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sizes = [size for size in (10_000, 100_000, 1_000_000, 10_000_000) if size <= largest]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{Path(directory) / 'bench.db'}", profile="write_heavy")
+        AppModel.metadata.create_all(engine)
+
+        print(f"{'heroes':>10} {'count(*) ms':>12} {'counter ms':>11} {'inserts/s':>10}")
+        inserted = 0
+        for size in sizes:
+            rate = insert_rate(engine, inserted, size - inserted)
+            inserted = size
+            scan = median_ms(
+                engine, lambda session: session.exec(select(func.count()).select_from(Hero)).one()
+            )
+            counter = median_ms(engine, lambda session: total_rows(session, Hero))
+            print(f"{size:>10,} {scan:>12.3f} {counter:>11.3f} {rate:>10,.0f}")
+
+        with engine.begin() as connection:
+            for trigger in ("hero_count_insert", "hero_count_delete"):
+                connection.exec_driver_sql(f"DROP TRIGGER {trigger}")
+        rate = insert_rate(engine, inserted, 100_000)
+        print(f"100,000 more heroes without the count triggers: {rate:,.0f} inserts/s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Deleting a team with 500k heroes: the ORM loading and unlinking every hero,
+delete_cascading() without foreign keys (one set-based UPDATE) and with
+foreign keys on (a single DELETE, ON DELETE SET NULL does the rest)
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_delete_team 500000
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sqlmodel import Session
+
+from ..bulk import bulk_insert, delete_cascading
+from ..database import make_engine
+from ..models import AppModel, Hero, Team
+
+
+def seed(engine, count: int) -> int:
+    AppModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        (team_id, other_team_id) = bulk_insert(
+            session,
+            Team,
+            [
+                {"name": "Big", "headquarters": "Everywhere"},
+                {"name": "Small", "headquarters": "Here"},
+            ],
+            return_ids=True,
+        )
+        bulk_insert(
+            session,
+            Hero,
+            (
+                {
+                    "name": f"Hero {i}",
+                    "secret_name": f"Secret {i}",
+                    # a few heroes of another team, that must be left alone
+                    "team_id": other_team_id if i % 100 == 0 else team_id,
+                }
+                for i in range(count)
+            ),
+        )
+        session.commit()
+    return team_id
+
+
+def orm_delete(session: Session, team: Team):
+    team.heroes  # noqa: B018 what a plain relationship does, load every hero
+    session.delete(team)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    print(f"{count:,} heroes")
+    print(f"{'mode':<12} {'seconds':>8} {'peak MiB':>9}")
+    for name, profile, delete in (
+        ("orm", "write_heavy", orm_delete),
+        ("set-based", "default", delete_cascading),
+        ("ondelete", "write_heavy", delete_cascading),
+    ):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = make_engine(
+                f"sqlite:///{Path(directory) / 'bench.db'}", profile=profile
+            )
+            team_id = seed(engine, count)
+            with Session(engine) as session:
+                team = session.get(Team, team_id)
+                tracemalloc.start()
+                start = time.perf_counter()
+                delete(session, team)
+                session.commit()
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            print(f"{name:<12} {elapsed:>8.2f} {peak / 2**20:>9.1f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Concurrent readers plus one writer, with the "default" profile (rollback
+journal) and the WAL based "read_heavy" and "write_heavy" profiles
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_engine_profiles 8 5
+"""
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from ..bulk import bulk_insert
+from ..database import make_engine
+from ..models import AppModel, Hero
+
+HERO_COUNT = 100_000
+
+
+def run(profile: str, readers: int, seconds: float) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile=profile, echo=False
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                    for i in range(HERO_COUNT)
+                ),
+            )
+            session.commit()
+
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        stop = time.perf_counter() + seconds
+
+        def count(key: str):
+            with lock:
+                counts[key] += 1
+
+        def reader():
+            while time.perf_counter() < stop:
+                try:
+                    with Session(engine) as session:
+                        age = random.randint(0, 99)
+                        session.exec(select(Hero).where(Hero.age == age).limit(20)).all()
+                    count("reads")
+                except OperationalError:
+                    # "database is locked"
+                    count("errors")
+
+        def writer():
+            i = 0
+            while time.perf_counter() < stop:
+                try:
+                    with Session(engine) as session:
+                        session.add(Hero(name=f"New {i}", secret_name="Secret", age=i % 100))
+                        session.commit()
+                    count("writes")
+                except OperationalError:
+                    count("errors")
+                i += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return {key: value / seconds for key, value in counts.items()}
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"{readers} readers + 1 writer for {seconds:g}s")
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'errors/s':>10}")
+    for profile in ("default", "read_heavy", "write_heavy"):
+        result = run(profile, readers, seconds)
+        print(
+            f"{profile:<12} {result['reads']:>10,.0f} "
+            f"{result['writes']:>10,.0f} {result['errors']:>10,.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+CPU time per GET /heroes/?limit=100 with the response_model serialization,
+with rows serialized by orjson (FAST_RESPONSES), and with the cached page
+answered by a 304 Not Modified
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_fast_json 2000
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from .. import main as api
+from ..bulk import bulk_insert
+from ..database import get_session, make_engine, query_cache
+from ..models import AppModel, Hero
+
+HERO_COUNT = 10_000
+PAGES = HERO_COUNT // 100
+# the cache is off unless QUERY_CACHE_SIZE is set
+CACHE_SIZE = 1000
+
+
+def run(client: TestClient, requests: int, etags: dict[int, str] | None = None) -> float:
+    """CPU microseconds per request, sending back the ETag of each page if `etags` is given"""
+    start = time.process_time()
+    for i in range(requests):
+        offset = (i % PAGES) * 100
+        headers = {"If-None-Match": etags[offset]} if etags and offset in etags else {}
+        response = client.get(f"/heroes/?offset={offset}&limit=100", headers=headers)
+        if etags is not None and response.status_code == 200:
+            etags[offset] = response.headers["ETag"]
+    return (time.process_time() - start) / requests * 1_000_000
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                    for i in range(HERO_COUNT)
+                ),
+            )
+            session.commit()
+
+        def get_session_override():
+            with Session(engine) as session:
+                yield session
+
+        api.app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(api.app)
+
+        print(f"{'mode':<28} {'CPU us/request':>15}")
+        print(f"{'response_model':<28} {run(client, requests):>15,.0f}")
+        api.FAST_RESPONSES = True
+        query_cache.maxsize = 0
+        print(f"{'orjson, no cache':<28} {run(client, requests):>15,.0f}")
+        # the pages are cached in query_cache
+        query_cache.maxsize = CACHE_SIZE
+        query_cache.clear()
+        run(client, PAGES)  # warm the cache
+        print(f"{'orjson, cached page':<28} {run(client, requests):>15,.0f}")
+        etags = {}
+        run(client, PAGES, etags)  # learn the ETags
+        print(f"{'orjson, cached, 304':<28} {run(client, requests, etags):>15,.0f}")
+        api.app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
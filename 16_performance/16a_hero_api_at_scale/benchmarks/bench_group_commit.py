@@ -0,0 +1,81 @@
+"""
+Throughput and latency of POST /heroes/ under concurrent writers, with a
+commit per hero versus group commits of different windows
+
+Uses the "default" engine profile, where each commit waits for an fsync.
+The async handler is awaited directly by concurrent tasks: without group
+commits it runs the write in the threadpool (40 workers), with them each
+task awaits the commit of its group. Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_group_commit 5000
+"""
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session
+
+from .. import main as api
+from ..database import make_engine
+from ..group_commit import GroupCommitQueue
+from ..models import AppModel, Hero, HeroCreate
+
+WRITERS = 200  # concurrent requests, more than the 40 threadpool workers
+WINDOWS_MS = (0, 1, 5, 20)
+
+
+async def run(engine, requests: int) -> tuple[float, float, float, int]:
+    """Rows per second, p50 and p99 latency in milliseconds, errors"""
+    latencies = []
+    errors = 0
+    writers = asyncio.Semaphore(WRITERS)
+
+    async def create(i: int):
+        nonlocal errors
+        async with writers:
+            start = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    hero = HeroCreate(name=f"Hero {i}", secret_name="Secret")
+                    await api.create_hero(session=session, hero=hero)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    return requests / elapsed, quantiles[49] * 1000, quantiles[98] * 1000, errors
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="default"
+        )
+        AppModel.metadata.create_all(engine)
+        print(f"{WRITERS} concurrent writers, {requests:,} heroes")
+        print(
+            f"{'window':>8} {'rows/s':>10} {'p50 ms':>8} {'p99 ms':>8}"
+            f" {'batches':>8} {'errors':>7}"
+        )
+        for window_ms in WINDOWS_MS:
+            api.hero_writes = GroupCommitQueue(engine, Hero, window_ms=window_ms)
+            rps, p50, p99, errors = asyncio.run(run(engine, requests))
+            api.hero_writes.close()
+            label = f"{window_ms} ms" if window_ms else "off"
+            batches = api.hero_writes.batches or requests
+            print(
+                f"{label:>8} {rps:>10,.0f} {p50:>8.1f} {p99:>8.1f}"
+                f" {batches:>8,} {errors:>7}"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
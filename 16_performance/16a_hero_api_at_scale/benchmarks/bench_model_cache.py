@@ -0,0 +1,88 @@
+"""
+Throughput of GET /heroes/{id} with 5% of the calls being PATCH /heroes/{id},
+with and without the model cache
+
+The handlers are called directly, without HTTP, to compare the database work.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_model_cache 20000
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session
+
+from ..bulk import bulk_insert
+from ..database import make_engine, model_cache
+from ..main import read_hero, update_hero
+from ..models import AppModel, Hero, HeroUpdate, Team
+
+HERO_COUNT = 10_000
+READ_RATIO = 0.95
+# the cache is off unless MODEL_CACHE_SIZE is set
+CACHE_SIZE = 10_000
+
+
+def run(engine, operations: int) -> float:
+    """Reads per second"""
+    random.seed(42)
+    reads = 0
+    start = time.perf_counter()
+    for i in range(operations):
+        # a hot set of heroes, like real traffic
+        hero_id = int(random.paretovariate(1.2)) % HERO_COUNT + 1
+        with Session(engine) as session:
+            if random.random() < READ_RATIO:
+                read_hero(session=session, request=None, hero_id=hero_id)
+                reads += 1
+            else:
+                update_hero(session=session, hero_id=hero_id, hero=HeroUpdate(age=i % 100))
+    return reads / (time.perf_counter() - start)
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            team_ids = bulk_insert(
+                session,
+                Team,
+                ({"name": f"Team {i}", "headquarters": "Somewhere"} for i in range(100)),
+                return_ids=True,
+            )
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {
+                        "name": f"Hero {i}",
+                        "secret_name": f"Secret {i}",
+                        "team_id": team_ids[i % 100],
+                    }
+                    for i in range(HERO_COUNT)
+                ),
+            )
+            session.commit()
+
+        print(f"{READ_RATIO:.0%} reads, {operations:,} operations")
+        model_cache.maxsize = 0
+        print(f"{'no cache':<10} {run(engine, operations):>10,.0f} reads/s")
+        model_cache.maxsize = CACHE_SIZE
+        model_cache.clear()
+        print(f"{'cache':<10} {run(engine, operations):>10,.0f} reads/s")
+        print(
+            f"hits {model_cache.hits:,}, misses {model_cache.misses:,}, "
+            f"evictions {model_cache.evictions:,}"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Latency of page N with `offset` versus keyset pagination (`after` cursor)
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_pagination 1000000
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, create_engine, select
+
+from ..bulk import bulk_insert
+from ..models import AppModel, Hero
+from ..pagination import keyset_page, next_cursor
+
+PAGE_SIZE = 100
+REPEAT = 20
+
+
+def timed(function) -> float:
+    """Average milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        function()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'bench.db'}")
+        AppModel.metadata.create_all(engine)
+        rows = (
+            {"name": f"Hero {i:07d}", "secret_name": f"Secret {i}", "age": i % 100}
+            for i in range(count)
+        )
+        with Session(engine) as session:
+            bulk_insert(session, Hero, rows)
+            session.commit()
+
+        print(f"{count:,} heroes, {PAGE_SIZE} per page, ordered by name")
+        print(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+        last_page = max(-(-count // PAGE_SIZE), 1)
+        # the pages that exist for `count` heroes, in order and each once
+        candidates = (1, 10, 100, 1_000, last_page // 2, last_page)
+        pages = sorted({page for page in candidates if 1 <= page <= last_page})
+        with Session(engine) as session:
+            for page in pages:
+                offset = (page - 1) * PAGE_SIZE
+                by_offset = select(Hero).order_by(Hero.name, Hero.id).offset(offset)
+                after = None
+                if offset:
+                    # the cursor a client would have received with the previous page
+                    last = session.exec(by_offset.offset(offset - 1).limit(1)).one()
+                    after = next_cursor(last, order_by="name", column=Hero.name, key=Hero.id)
+
+                offset_ms = timed(lambda: session.exec(by_offset.limit(PAGE_SIZE)).all())
+                keyset_ms = timed(
+                    lambda: keyset_page(
+                        session,
+                        select(Hero),
+                        order_by="name",
+                        column=Hero.name,
+                        key=Hero.id,
+                        after=after,
+                        limit=PAGE_SIZE,
+                    )
+                )
+                print(f"{page:>8,} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Latency and peak memory of a 10k row scan of heroes into HeroPublic payloads,
+loading full ORM instances versus selecting only the response model columns
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_projection 10000
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from ..bulk import bulk_insert
+from ..database import make_engine
+from ..models import AppModel, Hero, HeroPublic
+from ..projection import select_public
+
+ROUNDS = 5
+
+
+def load_entities(session: Session) -> list[dict]:
+    heroes = session.exec(select(Hero)).all()
+    return [HeroPublic.model_validate(hero).model_dump() for hero in heroes]
+
+
+def load_columns(session: Session) -> list[dict]:
+    return [hero._asdict() for hero in session.exec(select_public(Hero, HeroPublic))]
+
+
+def measure(engine, load) -> tuple[float, float]:
+    """Milliseconds per scan and peak MiB allocated by one scan"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        with Session(engine) as session:
+            load(session)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    tracemalloc.start()
+    with Session(engine) as session:
+        load(session)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2**20
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                    for i in range(count)
+                ),
+            )
+            session.commit()
+
+        print(f"{count:,} rows")
+        print(f"{'mode':<10} {'ms/scan':>10} {'peak MiB':>10}")
+        for name, load in (("entities", load_entities), ("columns", load_columns)):
+            elapsed, peak = measure(engine, load)
+            print(f"{name:<10} {elapsed:>10.1f} {peak:>10.1f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
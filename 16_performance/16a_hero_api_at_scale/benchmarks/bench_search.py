@@ -0,0 +1,105 @@
+"""
+Latency of searching heroes by name with the FTS5 index (GET /heroes/search)
+versus `LIKE '%word%'` on name and secret_name, which scans the whole table
+
+LIKE with a LIMIT stops at the first 20 matching rows, so it is fast for a
+word found everywhere and slow for a rare one (or none). FTS5 only reads the
+matching rows, but ranking scores all of them, a word in every row costs a
+full pass over its index.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_search 1000000
+"""
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import or_
+from sqlmodel import Session
+
+from ..bulk import bulk_insert
+from ..database import make_engine
+from ..models import AppModel, Hero, HeroPublic
+from ..projection import select_public
+from ..search import hero_fts, match_query
+
+SYLLABLES = ["ka", "ro", "mi", "zen", "tor", "vy", "lu", "dra", "shi", "pex", "no", "gar"]
+# 1728 made up words, each in about 1 name out of 860
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+QUERIES = [
+    "karomi",  # a word
+    "zento",  # a prefix
+    "karomi drashi",  # two words
+    "agent",  # in every secret name, ranking has to score them all
+    "nothing",  # no match, LIKE reads the whole table
+]
+RUNS = 20
+
+
+def fts_search(session: Session, q: str) -> list:
+    statement = (
+        select_public(Hero, HeroPublic)
+        .join(hero_fts, hero_fts.c.rowid == Hero.id)
+        .where(hero_fts.c.hero_fts.match(match_query(q)))
+        .order_by(hero_fts.c.rank)
+        .limit(20)
+    )
+    return session.exec(statement).all()
+
+
+def like_search(session: Session, q: str) -> list:
+    statement = select_public(Hero, HeroPublic).limit(20)
+    for word in q.split():
+        pattern = f"%{word}%"
+        statement = statement.where(
+            or_(Hero.name.like(pattern), Hero.secret_name.like(pattern))
+        )
+    return session.exec(statement).all()
+
+
+def median_ms(engine, search, q: str) -> float:
+    timings = []
+    with Session(engine) as session:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            search(session, q)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{Path(directory) / 'bench.db'}", profile="write_heavy")
+        AppModel.metadata.create_all(engine)
+        start = time.perf_counter()
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {
+                        "name": f"{random.choice(WORDS).title()} {random.choice(WORDS).title()}",
+                        "secret_name": f"Agent {random.choice(WORDS).title()}",
+                        "age": i % 100,
+                    }
+                    for i in range(count)
+                ),
+            )
+            session.commit()
+        print(f"inserted {count:,} heroes (indexed by the triggers) in {time.perf_counter() - start:.1f} s")
+
+        print(f"{'query':<14} {'fts ms':>10} {'like ms':>10}")
+        for q in QUERIES:
+            fts = median_ms(engine, fts_search, q)
+            like = median_ms(engine, like_search, q)
+            print(f"{q!r:<14} {fts:>10.2f} {like:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cost of GET /heroes/?limit=100 with echo on, SQL logging off, sampled,
+capturing only the requests with an X-SQL-Log: 1 header, and capturing everything
+
+The requests go through the app, so the middlewares are measured with the
+queries. The echo output goes to /dev/null, so only formatting the log records
+is measured, writing them to a terminal or a log pipeline comes on top of it.
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_sql_logging 2000
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from ..bulk import bulk_insert
+from ..database import get_session, make_engine
+from ..main import app
+from ..models import AppModel, Hero
+from ..sql_logging import SQLLog
+
+
+def use_engine(engine):
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+
+
+def run(client: TestClient, requests: int, headers: dict[str, str] | None = None) -> float:
+    """CPU microseconds per request"""
+    start = time.process_time()
+    for i in range(requests):
+        offset = (i * 100) % 9_900
+        client.get(f"/heroes/?offset={offset}&limit=100", headers=headers)
+    return (time.process_time() - start) / requests * 1_000_000
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        engine = make_engine(url, profile="read_heavy")
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                    for i in range(10_000)
+                ),
+            )
+            session.commit()
+
+        use_engine(engine)
+        client = TestClient(app)
+
+        print(f"{'mode':<24} {'CPU us/request':>15}")
+        print(f"{'off':<24} {run(client, requests):>15,.0f}")
+
+        for sample_rate in (0.01, 1.0):
+            sql_log = SQLLog(sample_rate=sample_rate)
+            sql_log.attach(engine)
+            label = f"sampled {sample_rate:.0%}"
+            print(f"{label:<24} {run(client, requests):>15,.0f}")
+            sql_log.configure(sample_rate=0)
+
+        sql_log = SQLLog(per_request=True)
+        sql_log.attach(engine)
+        print(f"{'per request, no header':<24} {run(client, requests):>15,.0f}")
+        label = "per request, X-SQL-Log"
+        print(f"{label:<24} {run(client, requests, {'X-SQL-Log': '1'}):>15,.0f}")
+        sql_log.configure(per_request=False)
+
+        echo_engine = make_engine(url, profile="read_heavy", echo=True)
+        # still format every record, but write them nowhere
+        for handler in logging.getLogger("sqlalchemy.engine.Engine").handlers:
+            handler.setStream(devnull)
+        use_engine(echo_engine)
+        print(f"{'echo':<24} {run(client, requests):>15,.0f}")
+        app.dependency_overrides.clear()
+        echo_engine.dispose()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
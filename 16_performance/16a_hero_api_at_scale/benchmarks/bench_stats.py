@@ -0,0 +1,97 @@
+"""
+Time to build the GET /stats/heroes response from the GROUP BY counts of
+stats.py, versus selecting every hero and aggregating in Python, and from
+the cached counts
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_stats 1000000
+"""
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from .. import main as api
+from ..bulk import bulk_insert
+from ..database import make_engine, query_cache
+from ..models import AppModel, Hero, Team
+from ..stats import count_ages, count_team_sizes, hero_stats
+
+RUNS = 5
+# the cache is off unless QUERY_CACHE_SIZE is set
+CACHE_SIZE = 1000
+
+
+def python_stats(session: Session):
+    ages = Counter()
+    team_sizes = Counter(dict.fromkeys(session.exec(select(Team.id)), 0))
+    for hero in session.exec(select(Hero)):
+        ages[hero.age] += 1
+        team_sizes[hero.team_id] += 1
+    session.expunge_all()
+    return hero_stats(ages, team_sizes, 10)
+
+
+def sql_stats(session: Session):
+    return hero_stats(count_ages(session), count_team_sizes(session), 10)
+
+
+def cached_stats(session: Session):
+    return api.read_hero_stats(session=session, bucket_width=10)
+
+
+def best_ms(engine, build) -> float:
+    timings = []
+    for _ in range(RUNS):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            build(session)
+            timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy")
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            team_ids = bulk_insert(
+                session,
+                Team,
+                ({"name": f"Team {i}", "headquarters": "?"} for i in range(100)),
+                return_ids=True,
+            )
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    {
+                        "name": f"Hero {i}",
+                        "secret_name": f"Secret {i}",
+                        "age": random.choice([None, *range(100)]),
+                        "team_id": random.choice([None, *team_ids]),
+                    }
+                    for i in range(count)
+                ),
+            )
+            session.commit()
+            assert python_stats(session) == sql_stats(session)
+
+        query_cache.maxsize = CACHE_SIZE
+        query_cache.clear()
+        print(f"{'mode':<24} {'ms':>10}")
+        print(f"{'rows, Python loop':<24} {best_ms(engine, python_stats):>10,.1f}")
+        print(f"{'GROUP BY':<24} {best_ms(engine, sql_stats):>10,.1f}")
+        print(f"{'GROUP BY, cached':<24} {best_ms(engine, cached_stats):>10,.3f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Peak RSS of reading every hero with `.all()` versus `stream()`
+
+Each mode runs in a fresh interpreter so the peaks don't mask each other.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_streaming 1000000
+"""
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, create_engine, select
+
+from ..bulk import bulk_insert
+from ..models import AppModel, Hero
+from ..streaming import stream
+
+
+def seed(url: str, count: int):
+    engine = create_engine(url)
+    AppModel.metadata.create_all(engine)
+    rows = (
+        {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+        for i in range(count)
+    )
+    with Session(engine) as session:
+        bulk_insert(session, Hero, rows)
+        session.commit()
+    engine.dispose()
+
+
+def measure(mode: str, url: str):
+    engine = create_engine(url)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    total_age = 0
+    with Session(engine) as session:
+        statement = select(Hero)
+        if mode == "all":
+            heroes = session.exec(statement).all()
+        else:
+            heroes = stream(session, statement)
+        for hero in heroes:
+            total_age += hero.age
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    print(
+        f"{mode:<8} peak RSS {peak / 1024:>8.1f} MiB "
+        f"(+{(peak - baseline) / 1024:.1f} MiB over baseline) in {elapsed:.2f}s"
+    )
+
+
+def main():
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        seed(url, count)
+        print(f"{count:,} heroes")
+        for mode in ("all", "stream"):
+            subprocess.run(
+                [sys.executable, "-m", __spec__.name, "--measure", mode, url],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
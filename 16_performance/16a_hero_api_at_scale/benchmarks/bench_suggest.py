@@ -0,0 +1,96 @@
+"""
+p50/p99 latency of GET /heroes/suggest: `name LIKE 'prefix%'` (case
+insensitive, which the BINARY `name` index can't serve), the range scan of
+the NOCASE index, and the range scan with the hot prefixes cached
+
+The handler is called directly with a session, like the server would after
+parsing the request. Prefixes are 1 to 4 letters of existing names, some much
+more typed than others.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_suggest 1000000
+"""
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session
+
+from .. import main as api
+from ..bulk import bulk_insert
+from ..database import make_engine, query_cache
+from ..models import AppModel, Hero, HeroSuggestion
+from ..projection import select_public
+
+REQUESTS = 5_000
+# the cache is off unless QUERY_CACHE_SIZE is set
+CACHE_SIZE = 1000
+
+
+def random_name() -> str:
+    return "".join(random.choices(string.ascii_letters, k=random.randint(5, 12)))
+
+
+def like_suggestions(session, low, high, case_sensitive, limit) -> list[dict]:
+    statement = (
+        select_public(Hero, HeroSuggestion)
+        .where(Hero.name.like(f"{low}%"))
+        .order_by(Hero.name)
+        .limit(limit)
+    )
+    return [hero._asdict() for hero in session.exec(statement)]
+
+
+def run(engine, prefixes: list[str]) -> tuple[float, float]:
+    """p50 and p99 in milliseconds"""
+    timings = []
+    with Session(engine) as session:
+        for prefix in prefixes:
+            start = time.perf_counter()
+            api.suggest_heroes(
+                session=session, request=None, prefix=prefix, limit=10, case_sensitive=False
+            )
+            timings.append(time.perf_counter() - start)
+    percentiles = statistics.quantiles(timings, n=100)
+    return percentiles[49] * 1000, percentiles[98] * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy")
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                ({"name": random_name(), "secret_name": "?"} for _ in range(count)),
+            )
+            session.commit()
+            names = session.exec(select_public(Hero, HeroSuggestion).limit(1000)).all()
+        # a Zipf like mix: a few prefixes are typed all the time
+        candidates = [row.name[: random.randint(1, 4)] for row in names]
+        weights = [1 / rank for rank in range(1, len(candidates) + 1)]
+        prefixes = random.choices(candidates, weights, k=REQUESTS)
+
+        print(f"{'mode':<22} {'p50 ms':>8} {'p99 ms':>8}")
+        query_cache.maxsize = 0
+        load_suggestions = api.load_suggestions
+        api.load_suggestions = like_suggestions
+        # fewer requests, the rare prefixes scan the whole table
+        print(f"{'LIKE, no cache':<22} {'%8.3f %8.3f' % run(engine, prefixes[:200])}")
+        api.load_suggestions = load_suggestions
+        print(f"{'range, no cache':<22} {'%8.3f %8.3f' % run(engine, prefixes)}")
+        query_cache.maxsize = CACHE_SIZE
+        query_cache.clear()
+        print(f"{'range, LRU cache':<22} {'%8.3f %8.3f' % run(engine, prefixes)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Updating the 100k heroes matching an age predicate by loading, changing and
+flushing each of them versus a single update_where() statement, with each
+session synchronization strategy
+
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_update_where 200000
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from ..bulk import bulk_insert, update_where
+from ..database import make_engine
+from ..models import AppModel, Hero
+
+
+def load_modify_commit(session: Session) -> int:
+    heroes = session.exec(select(Hero).where(Hero.age < 50)).all()
+    for hero in heroes:
+        hero.secret_name = "Classified"
+        session.add(hero)
+    return len(heroes)
+
+
+def set_based(synchronize_session):
+    def run(session: Session) -> int:
+        # like a request that already loaded a few of the heroes
+        session.exec(select(Hero).where(Hero.age < 50).limit(100)).all()
+        return update_where(
+            session,
+            Hero,
+            Hero.age < 50,
+            values={"secret_name": f"Classified ({synchronize_session})"},
+            synchronize_session=synchronize_session,
+        )
+
+    return run
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            bulk_insert(
+                session,
+                Hero,
+                (
+                    # half of the heroes are younger than 50
+                    {"name": f"Hero {i}", "secret_name": f"Secret {i}", "age": i % 100}
+                    for i in range(count)
+                ),
+            )
+            session.commit()
+
+        print(f"{'mode':<20} {'rows':>10} {'seconds':>10}")
+        for name, run in (
+            ("load-modify-commit", load_modify_commit),
+            ("evaluate", set_based("evaluate")),
+            ("fetch", set_based("fetch")),
+            ("none", set_based(False)),
+        ):
+            with Session(engine) as session:
+                start = time.perf_counter()
+                rows = run(session)
+                session.commit()
+                elapsed = time.perf_counter() - start
+            print(f"{name:<20} {rows:>10,} {elapsed:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
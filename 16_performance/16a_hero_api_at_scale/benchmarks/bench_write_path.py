@@ -0,0 +1,80 @@
+"""
+Latency of POST /heroes/ and PATCH /heroes/{id} with the commit + refresh()
+pattern of the tutorial versus save(), which skips the SELECT after the commit
+
+The handlers are called directly, without HTTP, to compare the database work.
+Run from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.benchmarks.bench_write_path 5000
+"""
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session
+
+from ..database import make_engine
+from ..main import save, update_hero
+from ..models import AppModel, Hero, HeroCreate, HeroPublic, HeroUpdate
+
+
+def create_hero_with_refresh(*, session: Session, hero: HeroCreate):
+    db_hero = Hero.model_validate(hero)
+    session.add(db_hero)
+    session.commit()
+    session.refresh(db_hero)
+    return HeroPublic.model_validate(db_hero)
+
+
+def create_hero_with_save(*, session: Session, hero: HeroCreate):
+    # what create_hero() runs in the threadpool when group commits are off
+    return save(session, Hero.model_validate(hero), HeroPublic)
+
+
+def update_hero_with_refresh(*, session: Session, hero_id: int, hero: HeroUpdate):
+    db_hero = session.get(Hero, hero_id)
+    db_hero.sqlmodel_update(hero.model_dump(exclude_unset=True))
+    session.add(db_hero)
+    session.commit()
+    session.refresh(db_hero)
+    return HeroPublic.model_validate(db_hero)
+
+
+def run(engine, create, update, count: int) -> tuple[float, float]:
+    """Median microseconds of a create and of an update"""
+    creates, updates = [], []
+    for i in range(count):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            hero = create(
+                session=session, hero=HeroCreate(name=f"Hero {i}", secret_name="Secret")
+            )
+            creates.append(time.perf_counter() - start)
+        with Session(engine) as session:
+            start = time.perf_counter()
+            update(session=session, hero_id=hero.id, hero=HeroUpdate(age=i % 100))
+            updates.append(time.perf_counter() - start)
+    return statistics.median(creates) * 1e6, statistics.median(updates) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}", profile="read_heavy"
+        )
+        AppModel.metadata.create_all(engine)
+        print(f"{'mode':<10} {'create us':>10} {'update us':>10}")
+        for name, create, update in (
+            ("refresh", create_hero_with_refresh, update_hero_with_refresh),
+            ("save", create_hero_with_save, update_hero),
+        ):
+            create_us, update_us = run(engine, create, update, count)
+            print(f"{name:<10} {create_us:>10.0f} {update_us:>10.0f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
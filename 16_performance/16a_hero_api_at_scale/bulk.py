@@ -0,0 +1,258 @@
+from collections.abc import Iterable, Iterator, Mapping
+from itertools import groupby, islice
+from typing import Any, Literal
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm import ONETOMANY
+from sqlmodel import Session, SQLModel, delete, insert, inspect, select, update
+
+# SQLite caps the number of bound parameters per statement (32766 since 3.32),
+# 1000 rows of a handful of columns stays well below it
+DEFAULT_CHUNK_SIZE = 1000
+
+# How update_where() and delete_where() bring the objects already loaded in the
+# session up to date: "evaluate" applies the WHERE and SET in Python to them,
+# "fetch" asks the database which rows matched (with RETURNING on SQLite),
+# False leaves them stale, "auto" is "evaluate" falling back to "fetch"
+SynchronizeSession = Literal["auto", "evaluate", "fetch", False]
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split an iterable into lists of at most `size` items without materializing it"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _row_builder(model: type[SQLModel]):
+    """
+    Return a function that turns a model instance or a dict into a row dict
+    with the same keys for every row, so a whole chunk can go through executemany
+    """
+    table = model.__table__
+    (primary_key,) = table.primary_key.columns
+    keys = [column.key for column in table.columns]
+    fields = {key: model.model_fields[key] for key in keys if key in model.model_fields}
+    defaults = {
+        key: field.get_default()
+        for key, field in fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+    factories = {
+        key: field.default_factory
+        for key, field in fields.items()
+        if field.default_factory is not None
+    }
+
+    def build(item: SQLModel | Mapping[str, Any]) -> dict[str, Any]:
+        # instance attributes live in __dict__, reading it skips model_dump()
+        data = item.__dict__ if isinstance(item, SQLModel) else item
+        row = {}
+        for key in keys:
+            if key in data:
+                row[key] = data[key]
+            elif key in factories:
+                row[key] = factories[key]()
+            else:
+                # a missing required column becomes NULL and the database rejects it
+                row[key] = defaults.get(key)
+        if row[primary_key.key] is None:
+            # let the database generate it
+            del row[primary_key.key]
+        return row
+
+    return build
+
+
+def bulk_insert(
+    session: Session,
+    model: type[SQLModel],
+    rows: Iterable[SQLModel | Mapping[str, Any]],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    return_ids: bool = False,
+) -> list[int] | int:
+    """
+    Insert many rows with one executemany per chunk instead of one INSERT per object
+
+    `rows` can be model instances (e.g. `Hero(...)`) or plain dicts, and can be a
+    generator, only `chunk_size` rows are held in memory at a time.
+    The rows are not validated and the instances are NOT added to the session,
+    so there is no identity map or unit of work bookkeeping for them.
+
+    Returns the list of generated primary keys (in input order) when `return_ids`
+    is True, using INSERT ... RETURNING, otherwise the number of inserted rows.
+    The caller is responsible for committing.
+    """
+    table = model.__table__
+    (primary_key,) = table.primary_key.columns
+    build = _row_builder(model)
+    statement = insert(table)
+    if return_ids:
+        statement = statement.returning(primary_key, sort_by_parameter_order=True)
+    connection = session.connection()
+
+    ids: list[int] = []
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        params = [build(item) for item in chunk]
+        # rows with an explicit primary key have a different set of columns,
+        # each consecutive run of rows with the same columns gets its own
+        # executemany so the rows are still inserted in input order (a generated
+        # id can't take an explicit id that comes later)
+        for _, run in groupby(params, lambda row: primary_key.key in row):
+            result = connection.execute(statement, list(run))
+            if return_ids:
+                ids.extend(result.scalars().all())
+        count += len(params)
+    return ids if return_ids else count
+
+
+def bulk_update(
+    session: Session,
+    model: type[SQLModel],
+    rows: Iterable[Mapping[str, Any]],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> set[Any]:
+    """
+    Update many rows by primary key, with one executemany per set of changed columns
+
+    Each row is a dict with the primary key and the columns to change, e.g.
+    `{"id": 1, "age": 49}`, rows changing the same columns share one
+    `UPDATE ... SET age=? WHERE id=?` statement. Later rows for the same
+    primary key win.
+    Like bulk_insert() the values are not validated, the ORM is bypassed
+    (objects already loaded in the session keep their old values) and the
+    caller is responsible for committing.
+
+    Returns the primary keys that exist. They were all updated, except those
+    only given without any column to change, which no UPDATE touches.
+    """
+    table = model.__table__
+    (primary_key,) = table.primary_key.columns
+    connection = session.connection()
+    # a bound parameter can't share its name with a column in the SET clause
+    statement = update(table).where(primary_key == bindparam("_primary_key"))
+
+    found: set[Any] = set()
+    for chunk in chunked(rows, chunk_size):
+        changes: dict[Any, dict[str, Any]] = {}
+        for row in chunk:
+            values = dict(row)
+            changes.setdefault(values.pop(primary_key.key), {}).update(values)
+        existing = set(
+            connection.execute(
+                select(primary_key).where(primary_key.in_(changes))
+            ).scalars()
+        )
+        groups: dict[frozenset[str], list[dict[str, Any]]] = {}
+        for key, values in changes.items():
+            if key in existing and values:
+                groups.setdefault(frozenset(values), []).append(
+                    {"_primary_key": key, **values}
+                )
+        for params in groups.values():
+            connection.execute(statement, params)
+        found |= existing
+    return found
+
+
+def update_where(
+    session: Session,
+    model: type[SQLModel],
+    *where: Any,
+    values: Mapping[str, Any],
+    synchronize_session: SynchronizeSession = "auto",
+) -> int:
+    """
+    Run a single `UPDATE ... SET ... WHERE ...` and return the number of rows changed
+
+    For example `update_where(session, Hero, Hero.age < 18, values={"age": 18})`,
+    instead of selecting the heroes, changing each object and flushing one
+    UPDATE per row. The caller is responsible for committing.
+    """
+    statement = update(model).where(*where).values(values)
+    result = session.exec(
+        statement, execution_options={"synchronize_session": synchronize_session}
+    )
+    return result.rowcount
+
+
+def delete_where(
+    session: Session,
+    model: type[SQLModel],
+    *where: Any,
+    synchronize_session: SynchronizeSession = "auto",
+) -> int:
+    """
+    Run a single `DELETE ... WHERE ...` and return the number of rows deleted
+
+    Relationship cascades of the ORM are not applied, the database's ON DELETE
+    rules are. The caller is responsible for committing.
+    """
+    statement = delete(model).where(*where)
+    result = session.exec(
+        statement, execution_options={"synchronize_session": synchronize_session}
+    )
+    return result.rowcount
+
+
+def foreign_keys_enforced(session: Session) -> bool:
+    """
+    Whether the database applies the foreign keys, and their ON DELETE rules
+
+    SQLite ignores them unless `PRAGMA foreign_keys=ON` was run on the connection,
+    the answer is kept with the pooled connection (the engine profiles set it
+    when connecting).
+    """
+    connection = session.connection()
+    if connection.dialect.name != "sqlite":
+        return True
+    if "foreign_keys" not in connection.info:
+        connection.info["foreign_keys"] = bool(
+            connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+        )
+    return connection.info["foreign_keys"]
+
+
+def delete_cascading(session: Session, obj: SQLModel):
+    """
+    Delete `obj` and let the ON DELETE rules of its children do the rest
+
+    The one-to-many relationships with `passive_deletes` don't load the
+    children, the database sets their foreign key to NULL (or deletes them)
+    with the single DELETE of `obj`. When it doesn't enforce foreign keys,
+    the same is done here with one set-based UPDATE (or DELETE) per child
+    table instead of loading the children.
+    The caller is responsible for committing.
+    """
+    if not foreign_keys_enforced(session):
+        mapper = inspect(type(obj))
+        (primary_key,) = mapper.primary_key_from_instance(obj)
+        done = set()
+        for relationship in mapper.relationships:
+            if relationship.direction is not ONETOMANY:
+                continue
+            if not relationship.passive_deletes:
+                continue
+            child = relationship.mapper.class_
+            for column in relationship.remote_side:
+                if (child, column) in done:
+                    continue
+                done.add((child, column))
+                (foreign_key,) = column.foreign_keys
+                ondelete = (foreign_key.ondelete or "").upper()
+                if ondelete == "SET NULL":
+                    update_where(
+                        session,
+                        child,
+                        column == primary_key,
+                        values={column.key: None},
+                        synchronize_session=False,
+                    )
+                elif ondelete == "CASCADE":
+                    delete_where(
+                        session, child, column == primary_key, synchronize_session=False
+                    )
+    session.delete(obj)
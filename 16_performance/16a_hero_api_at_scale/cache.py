@@ -0,0 +1,286 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from itertools import chain
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import MANYTOONE, ONETOMANY
+from sqlmodel import Session, SQLModel, inspect
+
+_MISSING = object()
+# matches any primary key in the keys given to invalidate()
+_ANY = object()
+
+
+class _Loading:
+    """A get_or_load() in progress, stale once its key is invalidated"""
+    __slots__ = ("stale",)
+
+    def __init__(self):
+        self.stale = False
+
+
+def entity_key(model: type[SQLModel], primary_key: Any) -> tuple:
+    """Cache key of one row, e.g. ("Hero", 1)"""
+    return (model.__name__, primary_key)
+
+
+def children_key(
+    parent: type[SQLModel], primary_key: Any, child: type[SQLModel]
+) -> tuple:
+    """Cache key of the rows of `child` pointing to one `parent`, e.g. ("Team", 1, "Hero")"""
+    return (parent.__name__, primary_key, child.__name__)
+
+
+class ModelCache:
+    """
+    In process LRU cache with a time to live, for response payloads of rows
+    that are read much more often than they change
+
+    Entries are dropped when the ORM flushes a change to their row (or to
+    one of the rows listed in a children entry), and again when that
+    transaction commits, so a read running between the flush and the commit
+    can't keep the old version around.
+    Statements run outside of the ORM unit of work (bulk_insert() or other
+    Core INSERT/UPDATE/DELETE) are not seen, call changed() or clear() after them.
+    """
+
+    def __init__(self, *, maxsize: int = 10_000, ttl: float = 30.0, name: str = "model_cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._loading: dict[Hashable, list[_Loading]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def version(self, model: type[SQLModel]) -> int:
+        """
+        Counter bumped by every change to a row of `model`, put it in the key
+        of entries built from many rows (like a page of a list) so they are
+        never served after a change
+        """
+        return self._versions.get(model.__name__, 0)
+
+    def get(self, key: Hashable) -> Any:
+        """The cached value, or _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """
+        Return the cached value of `key`, or call `load()` and cache its result
+
+        None results (e.g. a row that doesn't exist) are not cached, a row
+        inserted outside of the ORM could never show up otherwise.
+        A result is not cached either when `key` was invalidated while it was
+        loading, the load may have read the row before a change was committed.
+        """
+        if not self.enabled:
+            return load()
+        value = self.get(key)
+        if value is _MISSING:
+            loading = _Loading()
+            with self._lock:
+                self._loading.setdefault(key, []).append(loading)
+            try:
+                value = load()
+            except BaseException:
+                with self._lock:
+                    self._loaded(key, loading)
+                raise
+            with self._lock:
+                self._loaded(key, loading)
+                if value is not None and not loading.stale:
+                    self._set(key, value)
+        return value
+
+    def _loaded(self, key: Hashable, loading: _Loading):
+        loads = [other for other in self._loading[key] if other is not loading]
+        if loads:
+            self._loading[key] = loads
+        else:
+            del self._loading[key]
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                if isinstance(key, tuple) and _ANY in key:
+                    for cached in [k for k in self._entries if _matches(k, key)]:
+                        del self._entries[cached]
+                    loading = [k for k in self._loading if _matches(k, key)]
+                else:
+                    self._entries.pop(key, None)
+                    loading = [key] if key in self._loading else []
+                for loading_key in loading:
+                    for load in self._loading[loading_key]:
+                        load.stale = True
+
+    def changed(self, model: type[SQLModel], primary_keys: Iterable[Any]):
+        """
+        Drop what a statement run outside of the ORM (e.g. bulk_update()) changed
+        in the rows `primary_keys` of `model`, including every list of children
+        they may have left or joined
+        """
+        self.invalidate(
+            *(entity_key(model, primary_key) for primary_key in primary_keys),
+            (_ANY, _ANY, model.__name__),
+        )
+        self._bump([model.__name__])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for loads in self._loading.values():
+                for load in loads:
+                    load.stale = True
+
+    def render(self) -> str:
+        """Hit, miss and eviction counters in the Prometheus text format"""
+        lines = []
+        for name, value in (
+            ("hits", self.hits),
+            ("misses", self.misses),
+            ("evictions", self.evictions),
+        ):
+            lines.append(f"# TYPE {self.name}_{name}_total counter")
+            lines.append(f"{self.name}_{name}_total {value}")
+        lines.append(f"# TYPE {self.name}_entries gauge")
+        lines.append(f"{self.name}_entries {len(self._entries)}")
+        return "\n".join(lines) + "\n"
+
+    def listen(self, session_class: type[Session] = Session):
+        """
+        Invalidate the entries of the rows flushed by any session of `session_class`,
+        and of every row of a model changed by an ORM enabled UPDATE or DELETE
+        statement (e.g. update_where())
+        """
+        event.listen(session_class, "after_flush", self._after_flush)
+        event.listen(session_class, "do_orm_execute", self._do_orm_execute)
+        event.listen(session_class, "after_commit", self._after_commit)
+        event.listen(session_class, "after_soft_rollback", self._after_rollback)
+
+    def _bump(self, model_names):
+        with self._lock:
+            for name in model_names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def _after_flush(self, session: Session, flush_context):
+        objs = [
+            obj
+            for obj in chain(session.new, session.dirty, session.deleted)
+            if isinstance(obj, SQLModel)
+        ]
+        keys = [key for obj in objs for key in _keys_of(obj)]
+        model_names = {type(obj).__name__ for obj in objs}
+        for obj in objs:
+            if obj in session.deleted:
+                for child in _cascaded_models(type(obj)):
+                    keys.append((child, _ANY))
+                    model_names.add(child)
+        self.invalidate(*keys)
+        self._bump(model_names)
+        session.info.setdefault("model_cache_keys", set()).update(keys)
+        session.info.setdefault("model_cache_models", set()).update(model_names)
+
+    def _do_orm_execute(self, orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        model = orm_execute_state.bind_mapper.class_
+        name = model.__name__
+        # which rows match the WHERE clause is unknown
+        keys = [(name, _ANY), (name, _ANY, _ANY), (_ANY, _ANY, name)]
+        model_names = {name}
+        if orm_execute_state.is_delete:
+            for child in _cascaded_models(model):
+                keys.append((child, _ANY))
+                model_names.add(child)
+        self.invalidate(*keys)
+        self._bump(model_names)
+        session = orm_execute_state.session
+        session.info.setdefault("model_cache_keys", set()).update(keys)
+        session.info.setdefault("model_cache_models", set()).update(model_names)
+
+    def _after_commit(self, session: Session):
+        self.invalidate(*session.info.pop("model_cache_keys", ()))
+        self._bump(session.info.pop("model_cache_models", ()))
+
+    def _after_rollback(self, session: Session, previous_transaction):
+        session.info.pop("model_cache_keys", None)
+        session.info.pop("model_cache_models", None)
+
+
+def _matches(key: Hashable, pattern: tuple) -> bool:
+    return (
+        isinstance(key, tuple)
+        and len(key) == len(pattern)
+        and all(p is _ANY or k == p for k, p in zip(key, pattern))
+    )
+
+
+def _cascaded_models(model: type[SQLModel]) -> list[str]:
+    """
+    The models whose rows the database changes when a row of `model` is
+    deleted, through the ON DELETE rule of a passive_deletes relationship
+    """
+    return [
+        relationship.mapper.class_.__name__
+        for relationship in inspect(model).relationships
+        if relationship.direction is ONETOMANY and relationship.passive_deletes
+    ]
+
+
+def _keys_of(obj: SQLModel) -> list[tuple]:
+    """Every cache key that can contain `obj`, with its old and new foreign keys"""
+    mapper = inspect(type(obj))
+    state = inspect(obj)
+    primary_key = mapper.primary_key_from_instance(obj)[0]
+    model = mapper.class_
+    keys = [entity_key(model, primary_key)]
+    for relationship in mapper.relationships:
+        if relationship.direction is MANYTOONE:
+            parent = relationship.mapper.class_
+            for column in relationship.local_columns:
+                history = state.attrs[column.key].history
+                for value in chain(history.added, history.unchanged, history.deleted):
+                    if value is not None:
+                        keys.append(children_key(parent, value, model))
+                if history.added and not history.deleted and state.key is not None:
+                    # the foreign key of a stored row was set while expired, the
+                    # parent it used to point to is unknown
+                    keys.append(children_key(parent, _ANY, model))
+        elif relationship.direction is ONETOMANY:
+            child = relationship.mapper.class_
+            keys.append(children_key(model, primary_key, child))
+    return keys
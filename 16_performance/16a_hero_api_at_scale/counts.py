@@ -0,0 +1,95 @@
+from sqlalchemy import DDL, Table, event
+from sqlmodel import Field, Session, SQLModel, func, select
+
+from .models import AppModel, Hero, Team
+
+
+class RowCount(AppModel, table=True):
+    """The number of rows of a table, kept up to date by triggers on that table"""
+    __tablename__ = "row_count"
+
+    table_name: str = Field(primary_key=True)
+    rows: int = 0
+
+
+def _count_triggers(table: Table) -> list[str]:
+    name = table.name
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_count_insert AFTER INSERT ON {name} BEGIN
+            UPDATE row_count SET rows = rows + 1 WHERE table_name = '{name}';
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_count_delete AFTER DELETE ON {name} BEGIN
+            UPDATE row_count SET rows = rows - 1 WHERE table_name = '{name}';
+        END
+        """,
+    ]
+
+
+def _seed_count(table: Table):
+    """
+    An after_create listener counting the rows of `table` once, when it has no
+    counter yet (new databases, or rows there before the counter), not on
+    every create_all() of every worker start
+    """
+    name = table.name
+
+    def seed(target, connection, **kw):
+        if connection.dialect.name != "sqlite":
+            return
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM row_count WHERE table_name = ?", (name,)
+        ).first()
+        if exists is None:
+            connection.exec_driver_sql(
+                f"INSERT INTO row_count (table_name, rows) "
+                f"VALUES ('{name}', (SELECT count(*) FROM {name}))"
+            )
+
+    return seed
+
+
+def count_rows(*tables: Table):
+    """
+    Keep the number of rows of `tables` in row_count, so getting it is a
+    primary key lookup instead of a `SELECT count(*)` reading the whole table
+
+    The triggers run in the transaction of the INSERT or DELETE, for the
+    ORM, bulk_insert() and raw SQL alike, and roll back with it.
+    They are created after every table, row_count included, exists.
+    To fix a counter the triggers didn't see (like a restore), delete its
+    row from row_count, the next create_all() counts the rows again.
+    """
+    for table in tables:
+        for statement in _count_triggers(table):
+            event.listen(
+                AppModel.metadata,
+                "after_create",
+                DDL(statement).execute_if(dialect="sqlite"),
+            )
+        event.listen(AppModel.metadata, "after_create", _seed_count(table))
+
+
+count_rows(Hero.__table__, Team.__table__)
+
+
+def total_rows(session: Session, model: type[SQLModel]) -> int:
+    """The number of rows of `model`'s table, from its counter"""
+    statement = select(RowCount.rows).where(RowCount.table_name == model.__tablename__)
+    rows = session.exec(statement).first()
+    if rows is None:
+        # no triggers on this database
+        return session.exec(select(func.count()).select_from(model)).one()
+    return rows
+
+
+def count_matching(session: Session, statement) -> int:
+    """
+    The number of rows `statement` returns, without its offset, limit and order
+
+    It reads every matching row (at best from an index), only run it when asked.
+    """
+    statement = statement.limit(None).offset(None).order_by(None)
+    return session.exec(select(func.count()).select_from(statement.subquery())).one()
@@ -0,0 +1,180 @@
+import os
+
+from sqlalchemy import Engine, event
+from sqlmodel import Session, create_engine
+from sqlmodel.pool import StaticPool
+
+from .cache import ModelCache
+from .group_commit import GroupCommitQueue
+from .metrics import QueryMetrics
+from .models import AppModel, Hero
+from .sql_logging import SQLLog
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+# Named engine settings, "pragmas", "functions" and "collations" are set up
+# on every new SQLite connection (see init_connections()), "pool" goes to
+# create_engine()
+PROFILES = {
+    # SQLAlchemy and SQLite defaults, like the tutorial scripts
+    "default": {"pragmas": {}, "pool": {}},
+    # many concurrent readers, e.g. the API
+    "read_heavy": {
+        "pragmas": {
+            # readers don't block the writer (and the other way around)
+            "journal_mode": "WAL",
+            # in WAL mode, fsync at checkpoints instead of at every commit
+            "synchronous": "NORMAL",
+            # negative means KiB instead of pages: 64 MiB of page cache per connection
+            "cache_size": -64_000,
+            # read the database file through a 256 MiB memory map
+            "mmap_size": 268_435_456,
+            "temp_store": "MEMORY",
+            # wait up to 5s for a lock instead of failing with "database is locked"
+            "busy_timeout": 5_000,
+            # off by default in SQLite, and per connection: without it the
+            # ON DELETE rules (and the foreign keys themselves) are ignored
+            "foreign_keys": "ON",
+        },
+        # as many connections as the threadpool running the sync handlers has
+        # workers (40), plus an overflow. That doesn't bound the waits: a
+        # session keeps its connection from its first query until the
+        # dependency's teardown, after the response was validated (in another
+        # threadpool hop) and sent, so more requests than workers can hold
+        # one. Under heavy load the workers fill up with handlers waiting for
+        # a connection while the holders wait for a worker, pool_timeout turns
+        # that into errors instead of a hang (see benchmarks/bench_async_load.py)
+        "pool": {"pool_size": 40, "max_overflow": 10, "pool_timeout": 10},
+    },
+    # bulk loads and ingestion
+    "write_heavy": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16_000,
+            "temp_store": "MEMORY",
+            "busy_timeout": 30_000,
+            # checkpoint every ~40 MiB of WAL instead of ~4 MiB
+            "wal_autocheckpoint": 10_000,
+            "foreign_keys": "ON",
+        },
+        # SQLite has a single writer, a big pool would only queue more
+        # writers on its lock, they wait on busy_timeout instead
+        "pool": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 30},
+    },
+    # in memory databases for the tests: one connection shared by every session
+    "test": {
+        "pragmas": {"synchronous": "OFF", "foreign_keys": "ON"},
+        "pool": {"poolclass": StaticPool},
+    },
+}
+
+ENGINE_PROFILE = os.getenv("ENGINE_PROFILE", "read_heavy")
+# echo prints every statement and its parameters, only turn it on to debug,
+# the SQLLog below is the cheap alternative
+SQL_ECHO = os.getenv("SQL_ECHO") == "1"
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "0"))
+# record every statement of the requests sent with an "X-SQL-Log: 1" header
+SQL_LOG_PER_REQUEST = os.getenv("SQL_LOG_PER_REQUEST") == "1"
+# statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# cache of hero and team payloads, off unless MODEL_CACHE_SIZE is set (e.g. 10000),
+# it is invalidated by the writes of this process only, so use it with one worker
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "0"))
+MODEL_CACHE_TTL = float(os.getenv("MODEL_CACHE_TTL", "30"))
+# small LRU of query results over many heroes (the suggestions of hot prefixes,
+# the statistics, the pages of FAST_RESPONSES), off unless QUERY_CACHE_SIZE is
+# set (e.g. 1000). They are keyed on the Hero version of model_cache so any write
+# makes them unreachable, but only the ORM writes of this process move that
+# version, so like model_cache use it with one worker: with several, or after
+# bulk_insert() and other Core statements, they are stale for up to MODEL_CACHE_TTL
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "0"))
+# group the hero creations of this many milliseconds in one transaction,
+# 0 commits each one on its own
+GROUP_COMMIT_MS = float(os.getenv("GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_ROWS = int(os.getenv("GROUP_COMMIT_ROWS", "500"))
+
+
+def init_connections(engine: Engine, settings: dict):
+    """
+    Prepare every new DBAPI connection of `engine` as the profile `settings` say
+
+    "pragmas" run as `PRAGMA name=value`, "functions" (name: (number of
+    arguments, callable)) and "collations" (name: callable) are registered
+    on the connection. They only exist per connection in SQLite, doing it in
+    the "connect" event applies them to every connection of the pool, not
+    only to the one that happened to run them (or create the tables).
+    Collations need the sqlite3 driver, aiosqlite can't register them.
+    """
+    pragmas = settings.get("pragmas", {})
+    functions = settings.get("functions", {})
+    collations = settings.get("collations", {})
+    if not (pragmas or functions or collations):
+        return
+
+    @event.listens_for(engine, "connect")
+    def init_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        for name, (arguments, function) in functions.items():
+            dbapi_connection.create_function(
+                name, arguments, function, deterministic=True
+            )
+        for name, collation in collations.items():
+            dbapi_connection.create_collation(name, collation)
+
+
+def get_profile(profile: str) -> dict:
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"Unknown engine profile {profile!r}, use one of {', '.join(PROFILES)}"
+        ) from None
+
+
+def make_engine(url: str = sqlite_url, profile: str = ENGINE_PROFILE, **kwargs) -> Engine:
+    """
+    Create an engine configured by one of the PROFILES
+
+    Extra keyword arguments go to create_engine() and override the profile.
+    """
+    settings = get_profile(profile)
+    connect_args = {"check_same_thread": False}
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        **{"echo": SQL_ECHO, **settings["pool"], **kwargs},
+    )
+    init_connections(engine, settings)
+    return engine
+
+
+engine = make_engine()
+sql_log = SQLLog(sample_rate=SQL_LOG_SAMPLE_RATE, per_request=SQL_LOG_PER_REQUEST)
+sql_log.attach(engine)
+query_metrics = QueryMetrics(slow_query_ms=SLOW_QUERY_MS)
+query_metrics.attach(engine)
+model_cache = ModelCache(maxsize=MODEL_CACHE_SIZE, ttl=MODEL_CACHE_TTL)
+model_cache.listen()
+# not listening: its entries are never invalidated, only left behind by a new version
+query_cache = ModelCache(maxsize=QUERY_CACHE_SIZE, ttl=MODEL_CACHE_TTL, name="query_cache")
+hero_writes = GroupCommitQueue(
+    engine,
+    Hero,
+    window_ms=GROUP_COMMIT_MS,
+    max_rows=GROUP_COMMIT_ROWS,
+    on_commit=lambda ids: model_cache.changed(Hero, ids),
+)
+
+
+def create_db_and_tables():
+    AppModel.metadata.create_all(engine)
+
+
+def get_session():
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,38 @@
+import hashlib
+import json
+from typing import Any
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library, just slower
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def json_response(
+    request: Request, body: bytes, etag: str, headers: dict[str, str] | None = None
+) -> Response:
+    """
+    Send already serialized JSON, or an empty 304 if the client has this version
+
+    Returning a Response makes FastAPI skip the response_model validation
+    and serialization of the route.
+    """
+    headers = {**(headers or {}), "ETag": etag}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
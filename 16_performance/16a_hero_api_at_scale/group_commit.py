@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import Future
+from typing import Any
+
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel
+
+from .bulk import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitQueue:
+    """
+    Write-behind queue inserting the rows of `model` in groups, one transaction each
+
+    submit() returns a Future right away, a background thread collects the
+    rows submitted within `window_ms` of the first one (or up to `max_rows`)
+    and inserts them with a single bulk_insert() and commit. With synchronous
+    commits each one waits for an fsync, grouping them shares that wait
+    between every row of the group, at the cost of up to `window_ms` of latency.
+
+    The rows are not validated. If the group fails (e.g. a constraint violation)
+    its rows are retried one by one, so one bad row only fails its own Future.
+    `on_commit` is called with the new primary keys after each commit, e.g. to
+    invalidate caches, since the inserts bypass the ORM unit of work. Its
+    errors are logged, the rows are committed by then and are never retried.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        model: type[SQLModel],
+        *,
+        window_ms: float = 0,
+        max_rows: int = 500,
+        on_commit: Callable[[list[Any]], None] | None = None,
+    ):
+        self.engine = engine
+        self.model = model
+        self.window_ms = window_ms
+        self.max_rows = max_rows
+        self.on_commit = on_commit
+        self.batches = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    def submit(self, row: SQLModel | Mapping[str, Any]) -> Future:
+        """Queue a row (an instance or a dict), the Future gets its primary key"""
+        future: Future = Future()
+        with self._lock:
+            if self._worker is None:
+                # started on the first write, not at import time
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name=f"group-commit-{self.model.__tablename__}",
+                    daemon=True,
+                )
+                self._worker.start()
+        self._queue.put((row, future))
+        return future
+
+    def close(self, timeout: float | None = None):
+        """Write the rows still queued and stop the worker"""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window_ms / 1000
+            stop = False
+            while len(batch) < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list[tuple[Any, Future]]):
+        batch = [
+            (row, future)
+            for row, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        try:
+            ids = self._insert([row for row, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            ids = []
+            for row, future in batch:
+                try:
+                    (primary_key,) = self._insert([row])
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    ids.append(primary_key)
+                    future.set_result(primary_key)
+            self._committed(ids)
+            return
+        for (_, future), primary_key in zip(batch, ids):
+            future.set_result(primary_key)
+        self._committed(ids)
+
+    def _insert(self, rows: list[Any]) -> list[Any]:
+        with Session(self.engine) as session:
+            ids = bulk_insert(session, self.model, rows, return_ids=True)
+            session.commit()
+        self.batches += 1
+        return ids
+
+    def _committed(self, ids: list[Any]):
+        if self.on_commit is None or not ids:
+            return
+        try:
+            self.on_commit(ids)
+        except Exception:
+            logger.exception("on_commit failed for %s ids %s", self.model.__name__, ids)
@@ -0,0 +1,39 @@
+from sqlalchemy import Index, MetaData, Table, event
+
+
+def _needs_index(table: Table, column) -> bool:
+    if not column.foreign_keys or column.info.get("index") is False:
+        return False
+    if column.index or column.unique:
+        return False
+    # an index (or the primary key) starting with the column can be used instead
+    leading = [next(iter(index.columns), None) for index in table.indexes]
+    leading.append(next(iter(table.primary_key.columns), None))
+    return not any(first is column for first in leading)
+
+
+def add_foreign_key_indexes(table: Table):
+    for column in table.columns:
+        if _needs_index(table, column):
+            Index(f"ix_{table.name}_{column.name}", column)
+
+
+def index_foreign_keys(metadata: MetaData):
+    """
+    Index every foreign key column of the tables of `metadata`
+
+    SQLite doesn't do it on its own, without an index joins on the column,
+    filters like `Hero.team_id == 1` and the ON DELETE rules of the parent
+    table scan the whole child table.
+    Columns already leading another index are skipped, to opt out for a column
+    put `"index": False` in its info, e.g.
+    `Field(foreign_key="team.id", sa_column_kwargs={"info": {"index": False}})`.
+    Tables added to `metadata` later get theirs before create_all() creates them.
+    """
+    for table in metadata.tables.values():
+        add_foreign_key_indexes(table)
+
+    @event.listens_for(metadata, "before_create")
+    def index_new_tables(target, connection, tables=(), **kw):
+        for table in tables:
+            add_foreign_key_indexes(table)
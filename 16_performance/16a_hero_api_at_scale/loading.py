@@ -0,0 +1,49 @@
+from functools import cache
+from types import UnionType
+from typing import Any, Union, get_args, get_origin
+
+from pydantic import BaseModel
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import SQLModel, inspect
+
+
+def _response_model_of(annotation: Any) -> type[BaseModel] | None:
+    """The model inside an annotation like `TeamPublic | None` or `list[HeroPublic]`"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if get_origin(annotation) in (list, Union, UnionType):
+        for argument in get_args(annotation):
+            response_model = _response_model_of(argument)
+            if response_model is not None:
+                return response_model
+    return None
+
+
+@cache
+def eager_load(model: type[SQLModel], response_model: type[BaseModel]) -> tuple:
+    """
+    Loader options for every relationship of `model` that `response_model` serializes
+
+    Without them each relationship is lazy loaded with its own SELECT while
+    the response is built, once per row for a list (the N+1 problem).
+    Collections use `selectinload` (one extra SELECT ... WHERE id IN (...) for
+    all the rows), single objects use `joinedload` (a LEFT OUTER JOIN in the
+    same query), so the number of queries only depends on the response model.
+    Nested response models are followed, e.g. heroes with their team.
+    """
+    relationships = inspect(model).relationships
+    options = []
+    for name, field in response_model.model_fields.items():
+        if name not in relationships:
+            continue
+        relationship = relationships[name]
+        attribute = getattr(model, name)
+        if relationship.uselist:
+            loader = selectinload(attribute)
+        else:
+            loader = joinedload(attribute)
+        nested = _response_model_of(field.annotation)
+        if nested is not None:
+            loader = loader.options(*eager_load(relationship.mapper.class_, nested))
+        options.append(loader)
+    return tuple(options)
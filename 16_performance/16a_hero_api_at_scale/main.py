@@ -0,0 +1,528 @@
+import asyncio
+import os
+from functools import partial
+from typing import Literal
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import collate
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from .bulk import bulk_update, delete_cascading
+from .cache import children_key, entity_key
+from .counts import count_matching, total_rows
+from .database import (
+    create_db_and_tables,
+    get_session,
+    hero_writes,
+    model_cache,
+    query_cache,
+    query_metrics,
+)
+from .fast_json import dumps, json_response, make_etag
+from .loading import eager_load
+from .metrics import RequestMetricsMiddleware
+from .models import (
+    Hero,
+    HeroBatchStatus,
+    HeroBatchUpdate,
+    HeroCreate,
+    HeroPublic,
+    HeroPublicWithTeam,
+    HeroStats,
+    HeroSuggestion,
+    HeroUpdate,
+    Team,
+    TeamCreate,
+    TeamPublic,
+    TeamPublicWithHeroes,
+    TeamUpdate,
+)
+from .pagination import InvalidCursorError, keyset_page
+from .projection import public_columns, select_public
+from .search import hero_fts, match_query, prefix_range
+from .sql_logging import CaptureMiddleware
+from .stats import count_ages, count_team_sizes, hero_stats
+from .streaming import stream_partitions
+
+app = FastAPI()
+
+# columns the list endpoints can be ordered by, all of them are indexed
+HERO_ORDERINGS = {"id": Hero.id, "name": Hero.name, "age": Hero.age}
+TEAM_ORDERINGS = {"id": Team.id, "name": Team.name}
+
+# Serialize the hot read endpoints straight from row tuples with orjson and
+# send them with an ETag, instead of validating ORM objects with response_model.
+# The pages of /heroes/ are cached with their ETag when query_cache is on
+# (QUERY_CACHE_SIZE), single heroes when model_cache is on (MODEL_CACHE_SIZE)
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "0") == "1"
+
+
+# log every statement of the requests sent with an X-SQL-Log: 1 header
+app.add_middleware(CaptureMiddleware)
+# count the queries and the database time of each request
+app.add_middleware(RequestMetricsMiddleware, metrics=query_metrics)
+
+
+def save(session: Session, obj, response_model):
+    """
+    Write `obj` and return its response without the refresh() SELECT after the commit
+
+    The flush sends the INSERT/UPDATE, which brings back the generated id (and
+    server defaults, with RETURNING), and the response is built from the
+    object before the commit expires its attributes.
+    """
+    session.add(obj)
+    try:
+        session.flush()
+    except IntegrityError as exc:
+        session.rollback()
+        raise rejected(exc)
+    response = response_model.model_validate(obj)
+    session.commit()
+    return response
+
+
+def rejected(exc: IntegrityError) -> HTTPException:
+    """A 422 for a write the database refused, e.g. a team_id of no team"""
+    return HTTPException(status_code=422, detail=f"Rejected by the database: {exc.orig}")
+
+
+@app.on_event("startup")
+def on_startup():
+    create_db_and_tables()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    hero_writes.close()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Query latency histograms and per request query counts for Prometheus"""
+    return PlainTextResponse(
+        query_metrics.render() + model_cache.render() + query_cache.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@app.post("/heroes/", response_model=HeroPublic)
+async def create_hero(*, session: Session = Depends(get_session), hero: HeroCreate):
+    db_hero = Hero.model_validate(hero)
+    if hero_writes.enabled:
+        # await the group commit including this hero without holding a threadpool
+        # worker, so a group isn't capped by the number of workers
+        try:
+            db_hero.id = await asyncio.wrap_future(hero_writes.submit(db_hero))
+        except IntegrityError as exc:
+            raise rejected(exc)
+        return db_hero
+    return await run_in_threadpool(save, session, db_hero, HeroPublic)
+
+
+@app.get("/heroes/", response_model=list[HeroPublic])
+def read_heroes(
+    *,
+    session: Session = Depends(get_session),
+    request: Request,
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=100),
+    after: str | None = None,
+    order_by: Literal["id", "name", "age"] = "id",
+    team_id: int | None = None,
+    exact_count: bool = False,
+):
+    """
+    Pass the X-Next-Cursor header of a page as `after` to get the next one,
+    it stays fast on deep pages where a big `offset` has to skip every row before it
+
+    X-Total-Count has the number of heroes, for a `team_id` only with
+    `exact_count=true` since they have to be counted.
+    """
+    if after is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either offset or after")
+    statement = select_public(Hero, HeroPublic).offset(offset)
+    if team_id is not None:
+        # served by the team_id indexes ordered by id or name, by age the
+        # heroes of the team are sorted
+        statement = statement.where(Hero.team_id == team_id)
+    total = None
+    if team_id is None:
+        total = total_rows(session, Hero)
+    elif exact_count:
+        total = count_matching(session, statement)
+    load_page = partial(
+        keyset_page,
+        session,
+        statement,
+        order_by=order_by,
+        column=HERO_ORDERINGS[order_by],
+        key=Hero.id,
+        after=after,
+        limit=limit,
+    )
+    try:
+        if FAST_RESPONSES:
+            # any change to a hero changes the version, so a stale page is never
+            # found, the pages are kept in query_cache
+            key = (
+                ("Hero", "page", model_cache.version(Hero))
+                + (order_by, after, offset, limit, team_id)
+            )
+            return read_heroes_fast(request, key, load_page, total)
+        heroes, cursor = load_page()
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return [hero._asdict() for hero in heroes]
+
+
+def read_heroes_fast(request: Request, key: tuple, load_page, total: int | None) -> Response:
+    def load():
+        rows, cursor = load_page()
+        body = dumps([row._asdict() for row in rows])
+        return body, make_etag(body), cursor
+
+    body, etag, cursor = query_cache.get_or_load(key, load)
+    headers = {}
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    return json_response(request, body, etag, headers or None)
+
+
+@app.get("/heroes/export")
+def export_heroes(*, session: Session = Depends(get_session)):
+    """Stream every hero as newline delimited JSON (one HeroPublic per line)"""
+    # the response body is produced after this function returns,
+    # so the rows are read with a session owned by the generator itself
+    engine = session.get_bind()
+
+    def generate():
+        with Session(engine) as export_session:
+            statement = select_public(Hero, HeroPublic).order_by(Hero.id)
+            for heroes in stream_partitions(export_session, statement):
+                yield b"".join(dumps(hero._asdict()) + b"\n" for hero in heroes)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/heroes/search", response_model=list[HeroPublic])
+def search_heroes(
+    *,
+    session: Session = Depends(get_session),
+    q: str = Query(min_length=1, max_length=200),
+    offset: int = Query(default=0, ge=0, le=1000),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    """
+    Heroes whose name or secret name has words starting with the words of `q`,
+    best matches first, e.g. `?q=dead po`
+    """
+    query = match_query(q)
+    if query is None:
+        return []
+    statement = (
+        select_public(Hero, HeroPublic)
+        .join(hero_fts, hero_fts.c.rowid == Hero.id)
+        .where(hero_fts.c.hero_fts.match(query))
+        .order_by(hero_fts.c.rank)
+        .offset(offset)
+        .limit(limit)
+    )
+    return [hero._asdict() for hero in session.exec(statement)]
+
+
+@app.get("/heroes/suggest", response_model=list[HeroSuggestion])
+def suggest_heroes(
+    *,
+    session: Session = Depends(get_session),
+    request: Request,
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    case_sensitive: bool = False,
+):
+    """
+    Names starting with `prefix` in alphabetical order, for type-ahead
+
+    A range scan of the `name` index (or the NOCASE one by default), the
+    suggestions of popular prefixes can be kept in the small `query_cache` LRU
+    (off unless QUERY_CACHE_SIZE is set) until a hero changes. Changes made by
+    other processes (or outside of the ORM) are only seen once they expire,
+    after MODEL_CACHE_TTL.
+    """
+    low, high = prefix_range(prefix, nocase=not case_sensitive)
+    key = ("Hero", "suggest", model_cache.version(Hero), low, case_sensitive, limit)
+    suggestions = query_cache.get_or_load(
+        key, lambda: load_suggestions(session, low, high, case_sensitive, limit)
+    )
+    if FAST_RESPONSES:
+        body = dumps(suggestions)
+        return json_response(request, body, make_etag(body))
+    return suggestions
+
+
+def load_suggestions(
+    session: Session, low: str, high: str | None, case_sensitive: bool, limit: int
+) -> list[dict]:
+    name = Hero.name if case_sensitive else collate(Hero.name, "NOCASE")
+    statement = select_public(Hero, HeroSuggestion).where(name >= low)
+    if high is not None:
+        statement = statement.where(name < high)
+    statement = statement.order_by(name).limit(limit)
+    return [hero._asdict() for hero in session.exec(statement)]
+
+
+@app.get("/heroes/{hero_id}", response_model=HeroPublicWithTeam) # Include team information
+def read_hero(*, session: Session = Depends(get_session), request: Request, hero_id: int):
+    if FAST_RESPONSES:
+        body = dumps(read_hero_cached(session, hero_id))
+        return json_response(request, body, make_etag(body))
+    if model_cache.enabled:
+        return read_hero_cached(session, hero_id)
+    hero = session.get(Hero, hero_id, options=eager_load(Hero, HeroPublicWithTeam))
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    return hero
+
+
+def load_payload(session: Session, model, primary_key, response_model) -> dict | None:
+    """Select only the columns of `response_model`, no ORM object is built"""
+    (key,) = model.__table__.primary_key.columns
+    row = session.exec(
+        select_public(model, response_model).where(key == primary_key)
+    ).first()
+    return row._asdict() if row else None
+
+
+def read_hero_cached(session: Session, hero_id: int) -> dict:
+    hero = model_cache.get_or_load(
+        entity_key(Hero, hero_id),
+        lambda: load_payload(session, Hero, hero_id, HeroPublic),
+    )
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    team = None
+    if hero["team_id"] is not None:
+        team = model_cache.get_or_load(
+            entity_key(Team, hero["team_id"]),
+            lambda: load_payload(session, Team, hero["team_id"], TeamPublic),
+        )
+    return {**hero, "team": team}
+
+
+@app.patch("/heroes/", response_model=list[HeroBatchStatus])
+def update_heroes(*, session: Session = Depends(get_session), heroes: list[HeroBatchUpdate]):
+    """
+    Update many heroes in one transaction, e.g. `[{"id": 1, "age": 49}, ...]`
+
+    The heroes changing the same fields are updated with a single executemany,
+    instead of a get, an UPDATE and a refresh per hero. A hero given without
+    any field to change is "unchanged".
+    """
+    try:
+        found = bulk_update(
+            session, Hero, (hero.model_dump(exclude_unset=True) for hero in heroes)
+        )
+    except IntegrityError as exc:
+        # nothing is written, the batch is one transaction
+        session.rollback()
+        raise rejected(exc)
+    session.commit()
+    changed = {hero.id for hero in heroes if hero.model_fields_set - {"id"}}
+    updated = found & changed
+    model_cache.changed(Hero, updated)
+
+    def status(hero_id: int) -> str:
+        if hero_id not in found:
+            return "not_found"
+        return "updated" if hero_id in updated else "unchanged"
+
+    return [{"id": hero.id, "status": status(hero.id)} for hero in heroes]
+
+
+@app.patch("/heroes/{hero_id}", response_model=HeroPublic)
+def update_hero(
+    *, session: Session = Depends(get_session), hero_id: int, hero: HeroUpdate
+):
+    db_hero = session.get(Hero, hero_id)
+    if not db_hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    hero_data = hero.model_dump(exclude_unset=True)
+    db_hero.sqlmodel_update(hero_data)
+    return save(session, db_hero, HeroPublic)
+
+
+@app.delete("/heroes/{hero_id}")
+def delete_hero(*, session: Session = Depends(get_session), hero_id: int):
+    hero = session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    session.delete(hero)
+    session.commit()
+    return {"ok": True}
+
+
+@app.post("/teams/", response_model=TeamPublic)
+def create_team(*, session: Session = Depends(get_session), team: TeamCreate):
+    db_team = Team.model_validate(team)
+    return save(session, db_team, TeamPublic)
+
+
+@app.get("/teams/", response_model=list[TeamPublic])
+def read_teams(
+    *,
+    session: Session = Depends(get_session),
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=100),
+    after: str | None = None,
+    order_by: Literal["id", "name"] = "id",
+):
+    if after is not None and offset:
+        raise HTTPException(status_code=400, detail="Use either offset or after")
+    try:
+        teams, cursor = keyset_page(
+            session,
+            select_public(Team, TeamPublic).offset(offset),
+            order_by=order_by,
+            column=TEAM_ORDERINGS[order_by],
+            key=Team.id,
+            after=after,
+            limit=limit,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    response.headers["X-Total-Count"] = str(total_rows(session, Team))
+    return [team._asdict() for team in teams]
+
+
+@app.get("/teams/{team_id}", response_model=TeamPublicWithHeroes) # Include heroes in the response
+def read_team(*, team_id: int, session: Session = Depends(get_session)):
+    if model_cache.enabled:
+        return read_team_cached(session, team_id)
+    team = session.get(Team, team_id, options=eager_load(Team, TeamPublicWithHeroes))
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    return team
+
+
+def read_team_cached(session: Session, team_id: int) -> dict:
+    team = model_cache.get_or_load(
+        entity_key(Team, team_id),
+        lambda: load_payload(session, Team, team_id, TeamPublic),
+    )
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    heroes = model_cache.get_or_load(
+        children_key(Team, team_id, Hero),
+        lambda: [
+            row._asdict()
+            for row in session.exec(
+                select_public(Hero, HeroPublic).where(Hero.team_id == team_id)
+            )
+        ],
+    )
+    return {**team, "heroes": heroes}
+
+
+@app.get("/teams/{team_id}/heroes", response_model=list[HeroPublic])
+def read_team_heroes(
+    *,
+    session: Session = Depends(get_session),
+    response: Response,
+    team_id: int,
+    after: str | None = None,
+    limit: int = Query(default=100, ge=1, le=100),
+):
+    """One page of the heroes of a team, for rosters too big for GET /teams/{team_id}"""
+    team = session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    statement = team.members.select().with_only_columns(*public_columns(Hero, HeroPublic))
+    try:
+        heroes, cursor = keyset_page(
+            session,
+            statement,
+            order_by="id",
+            column=Hero.id,
+            key=Hero.id,
+            after=after,
+            limit=limit,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return [hero._asdict() for hero in heroes]
+
+
+@app.post("/teams/{team_id}/heroes", response_model=HeroPublic)
+def create_team_hero(
+    *, session: Session = Depends(get_session), team_id: int, hero: HeroCreate
+):
+    """Add a new hero to a team without loading the heroes it already has"""
+    team = session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    db_hero = Hero.model_validate(hero)
+    team.members.add(db_hero)
+    return save(session, db_hero, HeroPublic)
+
+
+@app.patch("/teams/{team_id}", response_model=TeamPublic)
+def update_team(
+    *,
+    session: Session = Depends(get_session),
+    team_id: int,
+    team: TeamUpdate,
+):
+    db_team = session.get(Team, team_id)
+    if not db_team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    team_data = team.model_dump(exclude_unset=True)
+    db_team.sqlmodel_update(team_data)
+    return save(session, db_team, TeamPublic)
+
+
+@app.delete("/teams/{team_id}")
+def delete_team(*, session: Session = Depends(get_session), team_id: int):
+    team = session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    # a single DELETE, the heroes are unlinked by the database
+    delete_cascading(session, team)
+    session.commit()
+    return {"ok": True}
+
+
+@app.get("/stats/heroes", response_model=HeroStats)
+def read_hero_stats(
+    *,
+    session: Session = Depends(get_session),
+    bucket_width: int = Query(default=10, ge=1, le=1000),
+):
+    """
+    Number of heroes, their min/max/average age, an age histogram with
+    buckets of `bucket_width` years and the number of heroes of each team
+
+    The counts can be kept in the small `query_cache` LRU (off unless
+    QUERY_CACHE_SIZE is set) until a hero or a team changes. Changes made by
+    other processes (or outside of the ORM) are only seen once they expire,
+    after MODEL_CACHE_TTL.
+    """
+    key = ("Hero", "stats", model_cache.version(Hero), model_cache.version(Team))
+    ages, team_sizes = query_cache.get_or_load(
+        key, lambda: (count_ages(session), count_team_sizes(session))
+    )
+    return hero_stats(ages, team_sizes, bucket_width)
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import Engine, event
+
+from .query_plan import explain
+from .sql_logging import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# seconds, like the Prometheus client defaults but starting lower, most
+# SQLite queries take well under a millisecond
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class RequestStats:
+    """Queries run and time spent in the database while handling one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# set by the middleware for each request, the handlers running in the threadpool
+# get a copy of the context pointing to the same RequestStats
+_request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def start_request() -> RequestStats:
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    series[i] += 1
+            series[len(BUCKETS)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_text = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            prefix = f"{label_text}," if label_text else ""
+            for bound, count in zip(BUCKETS, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[len(BUCKETS)]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[len(BUCKETS)]}")
+        return lines
+
+
+class QueryMetrics:
+    """
+    Latency of every statement, queries and database time per request,
+    and a warning log with the query plan for statements slower than `slow_query_ms`
+    """
+
+    def __init__(self, *, slow_query_ms: float = 100.0):
+        self.slow_query_ms = slow_query_ms
+        self.query_duration = Histogram(
+            "sql_query_duration_seconds",
+            "Time to execute a SQL statement.",
+            ("operation", "fingerprint"),
+        )
+        self.request_queries = Histogram(
+            "http_request_sql_queries",
+            "SQL statements executed per HTTP request.",
+            ("route",),
+        )
+        self.request_db_time = Histogram(
+            "http_request_sql_duration_seconds",
+            "Total SQL time per HTTP request.",
+            ("route",),
+        )
+
+    def attach(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def observe_request(self, route: str, stats: RequestStats):
+        self.request_queries.observe((route,), stats.queries)
+        self.request_db_time.observe((route,), stats.seconds)
+
+    def render(self) -> str:
+        """All the metrics in the Prometheus text exposition format"""
+        lines = []
+        for histogram in (self.query_duration, self.request_queries, self.request_db_time):
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._metrics_start
+        operation = statement.lstrip().split(None, 1)[0].upper()
+        self.query_duration.observe((operation, fingerprint(statement)), duration)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += duration
+        if duration * 1000 >= self.slow_query_ms and not executemany:
+            self._log_slow_query(conn, statement, parameters, duration)
+
+    def _log_slow_query(self, conn, statement, parameters, duration):
+        try:
+            plan = explain(conn.connection.dbapi_connection, statement, parameters)
+        except conn.dialect.loaded_dbapi.Error as exc:
+            plan = [f"EXPLAIN QUERY PLAN failed: {exc}"]
+        logger.warning(
+            "Slow query (%.1f ms): %s\nQuery plan:\n  %s",
+            duration * 1000,
+            statement,
+            "\n  ".join(plan),
+        )
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting the queries and the database time of each request
+    in `metrics`, and sending them in the X-DB-Queries and X-DB-Time-ms headers
+
+    A plain ASGI middleware rather than an `@app.middleware("http")` one, which
+    runs every request through an extra task and response stream.
+    The stats are read when the response starts, after the handler returned.
+    """
+
+    def __init__(self, app, metrics: QueryMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = start_request()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                # set by the router on the same scope
+                route = scope.get("route")
+                self.metrics.observe_request(route.path if route else "unmatched", stats)
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_stats)
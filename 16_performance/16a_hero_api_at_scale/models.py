@@ -0,0 +1,151 @@
+from typing import Literal
+
+from sqlalchemy import Index, text
+from sqlalchemy.orm import registry
+from sqlmodel import Field, Relationship, SQLModel
+
+from .indexes import index_foreign_keys
+
+
+class AppModel(SQLModel, registry=registry()):
+    """
+    Base of the app's tables, declared on their own MetaData (AppModel.metadata)
+
+    The lessons declare their hero and team tables on SQLModel.metadata, so the
+    indexes and triggers added below only apply to the app's tables, and both
+    can be loaded in the same process.
+    """
+
+
+class TeamBase(AppModel):
+    name: str = Field(index=True)
+    headquarters: str
+
+
+class Team(TeamBase, table=True):
+    # read server generated values back in the INSERT/UPDATE (with RETURNING)
+    # instead of a SELECT when they are accessed after the flush
+    __mapper_args__ = {"eager_defaults": True}
+
+    id: int | None = Field(default=None, primary_key=True)
+
+    # the database sets team_id to NULL (ondelete below), the heroes that
+    # aren't loaded are not loaded just to do it
+    heroes: list["Hero"] = Relationship(back_populates="team", passive_deletes=True)
+    # The same heroes as a write-only collection, for teams too big to load:
+    # team.members.add(hero) only INSERTs/UPDATEs the hero, and
+    # team.members.select() is a statement to filter, paginate or count them.
+    # Deleting a team leaves its heroes to the `heroes` relationship
+    members: list["Hero"] = Relationship(
+        sa_relationship_kwargs={
+            "lazy": "write_only",
+            "passive_deletes": True,
+            "overlaps": "heroes,team",
+        }
+    )
+
+
+class TeamCreate(TeamBase):
+    pass
+
+
+class TeamPublic(TeamBase):
+    id: int
+
+
+class TeamUpdate(SQLModel):
+    id: int | None = None
+    name: str | None = None
+    headquarters: str | None = None
+
+
+class HeroBase(AppModel):
+    name: str = Field(index=True)
+    secret_name: str
+    age: int | None = Field(default=None, index=True)
+
+    team_id: int | None = Field(default=None, foreign_key="team.id", ondelete="SET NULL")
+
+
+class Hero(HeroBase, table=True):
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # the heroes of a team ordered by name (then by id, SQLite ends every
+        # index with the rowid)
+        Index("ix_hero_team_id_name", "team_id", "name"),
+        # the heroes of a team ordered by id, the default order of the pages,
+        # above `name` comes before the rowid; it's also the foreign key's index
+        Index("ix_hero_team_id", "team_id"),
+        # case insensitive prefix lookups (the `name` index compares bytes),
+        # with the rowid it covers the id and name of the suggestions
+        Index("ix_hero_name_nocase", text("name COLLATE NOCASE")),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+
+    team: Team | None = Relationship(back_populates="heroes")
+
+
+class HeroPublic(HeroBase):
+    id: int
+
+
+class HeroCreate(HeroBase):
+    pass
+
+
+class HeroUpdate(SQLModel):
+    name: str | None = None
+    secret_name: str | None = None
+    age: int | None = None
+    team_id: int | None = None
+
+
+class HeroBatchUpdate(HeroUpdate):
+    """One item of a batch update, the fields to change of the hero `id`"""
+    id: int
+
+
+class HeroBatchStatus(SQLModel):
+    id: int
+    status: Literal["updated", "unchanged", "not_found"]
+
+
+class HeroSuggestion(SQLModel):
+    id: int
+    name: str
+
+
+class AgeBucket(SQLModel):
+    """The heroes with `start <= age < end`"""
+    start: int
+    end: int
+    count: int
+
+
+class TeamSize(SQLModel):
+    team_id: int | None
+    heroes: int
+
+
+class HeroStats(SQLModel):
+    count: int
+    min_age: int | None
+    max_age: int | None
+    avg_age: float | None
+    age_histogram: list[AgeBucket]
+    teams: list[TeamSize]
+
+
+class HeroPublicWithTeam(HeroPublic):
+    """Hero model with team information for public response"""
+    team: TeamPublic | None = None
+
+
+class TeamPublicWithHeroes(TeamPublic):
+    """Team model with heroes for public response"""
+    heroes: list[HeroPublic] = []
+
+
+# every foreign key column not covered by an index above gets one
+index_foreign_keys(AppModel.metadata)
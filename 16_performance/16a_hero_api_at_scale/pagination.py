@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from typing import Any
+
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import Session, and_, or_, tuple_
+from sqlmodel.sql.expression import SelectOfScalar
+
+
+class InvalidCursorError(ValueError):
+    """The cursor was not produced by `encode_cursor()` for the same ordering"""
+
+
+def encode_cursor(order_by: str, values: list[Any]) -> str:
+    """Pack the ordering name and the sort key of the last row into an opaque token"""
+    payload = json.dumps([order_by, values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+# the sort key values JSON can hold and SQLite can bind, integers are 64 bits,
+# booleans are left out as SQLAlchemy can't compare a column to them
+_SCALARS = (str, int, float, type(None))
+_MIN_INTEGER, _MAX_INTEGER = -(2**63), 2**63 - 1
+
+
+def _scalar(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return _MIN_INTEGER <= value <= _MAX_INTEGER
+    return isinstance(value, _SCALARS)
+
+
+def decode_cursor(cursor: str, order_by: str, size: int) -> list[Any]:
+    """The `size` sort key values packed in `cursor` by `encode_cursor()`"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_order_by, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise InvalidCursorError("Malformed cursor") from exc
+    if cursor_order_by != order_by:
+        raise InvalidCursorError(f"Cursor was created for order_by={cursor_order_by}")
+    if not isinstance(values, list) or len(values) != size or not all(map(_scalar, values)):
+        raise InvalidCursorError("Malformed cursor")
+    # the last value is the unique key, which is never NULL
+    if values[-1] is None:
+        raise InvalidCursorError("Malformed cursor")
+    return values
+
+
+def _fits(column: InstrumentedAttribute, value: Any) -> bool:
+    """Whether `value` can be a value of `column`, going by its Python type"""
+    if value is None:
+        return column.expression.nullable
+    python_type = column.type.python_type
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def _after(column: InstrumentedAttribute, key: InstrumentedAttribute, values: list[Any]):
+    """
+    WHERE clause selecting the rows after `values` in (column, key) order
+
+    SQLite sorts NULLs first, so after a NULL value come the remaining NULLs
+    (by key) and then every non NULL value.
+    A row value comparison `(column, key) > (?, ?)` can use the index on
+    `column`, as SQLite indexes always end with the rowid.
+    """
+    if column is key:
+        return key > values[0]
+    value, last_key = values
+    if value is None:
+        return or_(and_(column.is_(None), key > last_key), column.is_not(None))
+    return tuple_(column, key) > tuple_(value, last_key)
+
+
+def keyset_page(
+    session: Session,
+    statement: SelectOfScalar,
+    *,
+    order_by: str,
+    column: InstrumentedAttribute,
+    key: InstrumentedAttribute,
+    after: str | None,
+    limit: int,
+) -> tuple[list[Any], str | None]:
+    """
+    Return one page of `statement` ordered by (column, key) and the cursor of the next page
+
+    Unlike OFFSET, the database seeks directly to the first row of the page,
+    so reading page N costs the same for any N.
+    `key` must be unique (usually the primary key) to make the ordering stable.
+    `order_by` is the public name of the ordering, stored in the cursor so it
+    can't be reused with another ordering.
+    The next cursor is None on the last page.
+    """
+    if limit < 1:
+        raise ValueError(f"A page holds at least one row, got limit={limit}")
+    if column is key:
+        statement = statement.order_by(key)
+    else:
+        statement = statement.order_by(column, key)
+    if after is not None:
+        values = decode_cursor(after, order_by, 1 if column is key else 2)
+        columns = [key] if column is key else [column, key]
+        if not all(map(_fits, columns, values)):
+            # e.g. a name for the age, the page would silently be wrong
+            raise InvalidCursorError("Malformed cursor")
+        statement = statement.where(_after(column, key, values))
+    # one extra row tells whether there is a next page
+    items = session.exec(statement.limit(limit + 1)).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, next_cursor(items[-1], order_by=order_by, column=column, key=key)
+
+
+def next_cursor(
+    last: Any,
+    *,
+    order_by: str,
+    column: InstrumentedAttribute,
+    key: InstrumentedAttribute,
+) -> str:
+    """Cursor pointing right after the object `last`"""
+    if column is key:
+        return encode_cursor(order_by, [getattr(last, key.key)])
+    return encode_cursor(order_by, [getattr(last, column.key), getattr(last, key.key)])
@@ -0,0 +1,25 @@
+from functools import cache
+
+from pydantic import BaseModel
+from sqlmodel import SQLModel, select
+
+
+@cache
+def public_columns(model: type[SQLModel], response_model: type[BaseModel]) -> tuple:
+    """The columns of `model` that `response_model` returns, in its field order"""
+    columns = model.__table__.columns
+    return tuple(
+        getattr(model, name) for name in response_model.model_fields if name in columns
+    )
+
+
+def select_public(model: type[SQLModel], response_model: type[BaseModel]):
+    """
+    SELECT only the columns `response_model` returns, e.g. only `id` and `name` for HeroSuggestion
+
+    The results are plain rows (named tuples), not ORM instances, so there is
+    no identity map registration or attribute instrumentation per row, and
+    columns dropped by the response are not even read from the database.
+    Use `row._asdict()` (or `row._mapping`) to build the response.
+    """
+    return select(*public_columns(model, response_model))
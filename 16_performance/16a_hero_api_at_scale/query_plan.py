@@ -0,0 +1,224 @@
+"""
+EXPLAIN QUERY PLAN of the statements an application runs
+
+As a test utility, record the plans while the code runs and fail on full
+table scans or temporary sorts that are not explicitly allowed:
+
+    with record_plans(engine) as plans:
+        client.get("/heroes/?order_by=name")
+    assert_plans(plans, allowed={("ORDER BY hero.id LIMIT", "SCAN hero"): "stops after LIMIT rows"})
+
+As a command, run tutorial scripts and print the plan of every statement
+they send, from the repository root:
+
+    python -m 16_performance.16a_hero_api_at_scale.query_plan 05_filter_data_where/*.py
+
+Each script runs in its own process and in a temporary directory (so the
+scripts' database.db files are left alone), the exit status is 1 when a
+plan has a problem not matched by an `--allow STATEMENT PLAN_LINE` pair.
+"""
+import argparse
+import io
+import json
+import os
+import re
+import runpy
+import subprocess
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, NamedTuple
+
+from sqlalchemy import Engine, event
+
+_WHITESPACE = re.compile(r"\s+")
+# SCAN is a walk over a whole table or index, SEARCH only reads the matching
+# range; "SCAN CONSTANT ROW" is a SELECT without a table, and a virtual table
+# with constraints (like an FTS5 MATCH, "INDEX 32:M2") does its own lookup
+_FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?!\S+ VIRTUAL TABLE INDEX \d+:\S)")
+_TEMP_B_TREE = "USE TEMP B-TREE"
+_EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def explain(dbapi_connection: Any, statement: str, parameters: Any = ()) -> list[str]:
+    """
+    The EXPLAIN QUERY PLAN lines of a statement, e.g. `SEARCH hero USING INDEX ix_hero_name (name=?)`
+
+    Runs on the raw DBAPI connection, so it can be used from inside engine
+    events without triggering them again.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        # rows are (id, parent, notused, detail)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+class PlannedStatement(NamedTuple):
+    # on a single line
+    statement: str
+    plan: list[str]
+
+    @property
+    def problems(self) -> list[str]:
+        """The plan lines reading a whole table or index, or sorting in a temporary B-tree"""
+        return [
+            line for line in self.plan if _FULL_SCAN.match(line) or _TEMP_B_TREE in line
+        ]
+
+
+@contextmanager
+def record_plans(target: Engine | type[Engine] = Engine) -> Iterator[list[PlannedStatement]]:
+    """
+    Collect the plan of each different statement run inside the block,
+    on `target` or by default on every engine
+
+    Only SELECT, UPDATE and DELETE are explained, INSERTs and the schema
+    statements have no plan worth checking. executemany is skipped too.
+    """
+    plans: list[PlannedStatement] = []
+    seen: set[str] = set()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statement = _WHITESPACE.sub(" ", statement).strip()
+        if executemany or statement in seen:
+            return
+        if not statement.upper().startswith(_EXPLAINED):
+            return
+        seen.add(statement)
+        plan = explain(conn.connection.dbapi_connection, statement, parameters)
+        plans.append(PlannedStatement(statement, plan))
+
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield plans
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def unexpected_problems(
+    plans: Iterable[PlannedStatement], allowed: Iterable[tuple[str, str]] = ()
+) -> list[PlannedStatement]:
+    """
+    The statements with a plan problem that is not allowed
+
+    `allowed` holds (statement, plan line) pairs of regular expressions: a
+    problem is fine when the statement pattern is found in the statement and
+    the plan line pattern matches the whole line, so allowing
+    `SCAN hero USING INDEX ix_hero_name` for a query never excuses a
+    temporary sort, or a scan of another index, in its plan.
+    """
+    patterns = [
+        (re.compile(statement), re.compile(line)) for statement, line in allowed
+    ]
+
+    def excused(planned: PlannedStatement, problem: str) -> bool:
+        return any(
+            statement.search(planned.statement) and line.fullmatch(problem)
+            for statement, line in patterns
+        )
+
+    return [
+        planned
+        for planned in plans
+        if any(not excused(planned, problem) for problem in planned.problems)
+    ]
+
+
+def assert_plans(
+    plans: Iterable[PlannedStatement],
+    allowed: Mapping[tuple[str, str], str] | Iterable[tuple[str, str]] = (),
+):
+    """
+    Fail on the full scans and temporary sorts not in `allowed`, a list of
+    (statement, plan line) patterns or a dict of them to the reason it is fine
+    """
+    failures = unexpected_problems(plans, allowed)
+    if failures:
+        raise AssertionError(
+            "Statements without a usable index:\n"
+            + "\n".join(_format(planned) for planned in failures)
+        )
+
+
+def run_script(path: str) -> list[PlannedStatement]:
+    """
+    Run a script as `__main__` in a temporary directory and record its plans
+
+    A script raising (some show an error on purpose, like `.one()` without
+    a result) keeps the plans of the statements it ran, the error is
+    written to stderr.
+    """
+    path = os.path.abspath(path)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            # the scripts print their results and echo their SQL
+            with record_plans() as plans, redirect_stdout(io.StringIO()):
+                runpy.run_path(path, run_name="__main__")
+        except Exception as exc:
+            print(f"{path} raised {exc!r}", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+    return plans
+
+
+def _format(planned: PlannedStatement) -> str:
+    problems = planned.problems
+    lines = [planned.statement]
+    for line in planned.plan:
+        lines.append(f"  {'!' if line in problems else ' '} {line}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scripts", nargs="+")
+    parser.add_argument(
+        "--allow",
+        action="append",
+        nargs=2,
+        default=[],
+        metavar=("STATEMENT", "PLAN_LINE"),
+        help="regular expressions of a statement and of the scan or sort that is fine in its plan",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print the plans of a single script as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    if args.json:
+        (script,) = args.scripts
+        print(json.dumps([planned._asdict() for planned in run_script(script)]))
+        return 0
+
+    failed = False
+    for script in args.scripts:
+        # every script declares its own tables on the shared SQLModel metadata
+        child = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--json", script],
+            capture_output=True,
+            text=True,
+        )
+        print(f"== {script}")
+        if child.stderr:
+            print(child.stderr.rstrip())
+        if child.returncode:
+            failed = True
+            continue
+        plans = [PlannedStatement(**item) for item in json.loads(child.stdout)]
+        failures = unexpected_problems(plans, args.allow)
+        failed = failed or bool(failures)
+        for planned in plans:
+            marker = "FAIL " if planned in failures else ""
+            print(f"{marker}{_format(planned)}")
+        print()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
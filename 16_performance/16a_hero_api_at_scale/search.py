@@ -0,0 +1,119 @@
+import re
+import sys
+
+from sqlalchemy import DDL, column, event, table
+
+from .models import AppModel, Hero
+
+# Full-text index of the hero names, an FTS5 "external content" table: it only
+# stores the index and reads the text from `hero` itself, the triggers keep it
+# in sync with every INSERT, UPDATE and DELETE (ORM, Core or raw SQL alike).
+# remove_diacritics lets "e" match "é", prefix='2 3' also indexes the first
+# 2 and 3 characters of each word so short prefix queries stay fast.
+FTS_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS hero_fts USING fts5(
+        name, secret_name,
+        content='hero', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hero_fts_insert AFTER INSERT ON hero BEGIN
+        INSERT INTO hero_fts (rowid, name, secret_name)
+        VALUES (new.id, new.name, new.secret_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hero_fts_delete AFTER DELETE ON hero BEGIN
+        INSERT INTO hero_fts (hero_fts, rowid, name, secret_name)
+        VALUES ('delete', old.id, old.name, old.secret_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hero_fts_update AFTER UPDATE OF name, secret_name ON hero
+    BEGIN
+        INSERT INTO hero_fts (hero_fts, rowid, name, secret_name)
+        VALUES ('delete', old.id, old.name, old.secret_name);
+        INSERT INTO hero_fts (rowid, name, secret_name)
+        VALUES (new.id, new.name, new.secret_name);
+    END
+    """,
+    # index the rows that were already there
+    "INSERT INTO hero_fts (hero_fts) VALUES ('rebuild')",
+]
+
+
+@event.listens_for(AppModel.metadata, "after_create")
+def create_hero_fts(target, connection, **kw):
+    """
+    Create hero_fts and its triggers after the tables, including when `hero`
+    already existed (create_all() doesn't create it, nor fires its events)
+
+    The rows are only indexed when hero_fts is new, the triggers keep it in
+    sync from then on.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'hero_fts'"
+    ).first()
+    statements = FTS_STATEMENTS if exists is None else FTS_STATEMENTS[:-1]
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+event.listen(
+    Hero.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS hero_fts").execute_if(dialect="sqlite"),
+)
+
+# the virtual table, for building queries, `rank` is its bm25() score
+hero_fts = table("hero_fts", column("rowid"), column("rank"), column("hero_fts"))
+
+
+def match_query(text: str) -> str | None:
+    """
+    Turn what a user typed into an FTS5 query: every word must match the
+    start of a word of the name or secret name, in any order
+
+    Each word is quoted, so the FTS5 syntax (AND, OR, NEAR, *, ...) can't be
+    injected, e.g. `dead po` becomes `"dead"* "po"*`.
+    Returns None when there is no word to search for.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+# SQLite's NOCASE only folds the ASCII letters
+_ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+def prefix_range(prefix: str, *, nocase: bool = False) -> tuple[str, str | None]:
+    """
+    Bounds of the strings starting with `prefix`, `low <= name < high`
+
+    Unlike `LIKE 'prefix%'` a range is always searched with an index on the
+    column, e.g. "Dea" gives ("Dea", "Deb"). With `nocase` the bounds are
+    lowercase, like the values NOCASE compares.
+    `high` is None when no string is above the prefix (it only has U+10FFFF).
+    """
+    if nocase:
+        prefix = prefix.translate(_ASCII_LOWER)
+    # the last character that can still be incremented, "a\U0010ffff" gives "b"
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return prefix, None
+    following = ord(stem[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # surrogates are not characters, SQLite can't store them
+        following = 0xE000
+    elif nocase and chr(following) == "A":
+        # after "@" NOCASE sees "a", the next folded character is "["
+        following = ord("[")
+    return prefix, stem[:-1] + chr(following)
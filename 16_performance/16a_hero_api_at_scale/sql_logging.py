@@ -0,0 +1,139 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import NamedTuple
+
+from sqlalchemy import Engine, event
+
+# set by SQLLog.capture() for the current request (or any other context)
+_capturing: ContextVar[bool] = ContextVar("sql_log_capturing", default=False)
+
+_WHITESPACE = re.compile(r"\s+")
+# IN lists are expanded to one placeholder per value
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+class SQLRecord(NamedTuple):
+    fingerprint: str
+    statement: str
+    duration_ms: float
+    # affected rows for INSERT/UPDATE/DELETE, None for SELECT as the rows
+    # haven't been fetched yet when the statement returns
+    rowcount: int | None
+    timestamp: float
+
+
+@contextmanager
+def capture() -> Iterator[None]:
+    """Record every statement executed in this context by the logs with `per_request` on"""
+    token = _capturing.set(True)
+    try:
+        yield
+    finally:
+        _capturing.reset(token)
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware running the requests sent with an X-SQL-Log: 1 header in `capture()`
+
+    A plain ASGI middleware rather than an `@app.middleware("http")` one, so
+    the other requests only pay for looking the header up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (b"x-sql-log", b"1") not in scope["headers"]:
+            await self.app(scope, receive, send)
+            return
+        with capture():
+            await self.app(scope, receive, send)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Short id shared by every execution of the same statement, whatever its values"""
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _STRING.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(?+)", normalized)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+class SQLLog:
+    """
+    Structured SQL log kept in a ring buffer of the last `capacity` statements
+
+    Statements are recorded for a random `sample_rate` fraction of executions,
+    plus every execution inside `capture()` when `per_request` is on.
+    With neither, no event listener is registered on the engine at all,
+    so a disabled log costs nothing per query.
+    """
+
+    def __init__(
+        self, *, capacity: int = 1000, sample_rate: float = 0.0, per_request: bool = False
+    ):
+        self.records: deque[SQLRecord] = deque(maxlen=capacity)
+        self.sample_rate = sample_rate
+        self.per_request = per_request
+        self._engines: list[Engine] = []
+        self._listening = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.per_request
+
+    def attach(self, engine: Engine):
+        self._engines.append(engine)
+        if self._listening:
+            self._listen(engine)
+        self._update_listeners()
+
+    def configure(self, *, sample_rate: float | None = None, per_request: bool | None = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if per_request is not None:
+            self.per_request = per_request
+        self._update_listeners()
+
+    def _update_listeners(self):
+        with self._lock:
+            if self.enabled and not self._listening:
+                for engine in self._engines:
+                    self._listen(engine)
+                self._listening = True
+            elif not self.enabled and self._listening:
+                for engine in self._engines:
+                    event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+                    event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+                self._listening = False
+
+    def _listen(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if (self.per_request and _capturing.get()) or random.random() < self.sample_rate:
+            context._sql_log_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_sql_log_start", None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        rowcount = cursor.rowcount if cursor.rowcount >= 0 else None
+        self.records.append(
+            SQLRecord(fingerprint(statement), statement, duration_ms, rowcount, time.time())
+        )
@@ -0,0 +1,62 @@
+from sqlmodel import Session, func, select
+
+from .models import AgeBucket, Hero, HeroStats, Team, TeamSize
+
+
+def count_ages(session: Session) -> dict[int | None, int]:
+    """
+    Number of heroes of each age (None for the heroes without one)
+
+    One GROUP BY over the `age` index, which already has the ages in order,
+    so SQLite neither reads the rows nor sorts, and a few hundred counts come
+    back instead of every hero.
+    """
+    statement = select(Hero.age, func.count()).group_by(Hero.age)
+    return dict(session.exec(statement).all())
+
+
+def count_team_sizes(session: Session) -> dict[int | None, int]:
+    """
+    Number of heroes of each team (None for the heroes without one), from the
+    team_id index, with the teams without heroes at 0
+    """
+    sizes = dict.fromkeys(session.exec(select(Team.id)).all(), 0)
+    statement = select(Hero.team_id, func.count()).group_by(Hero.team_id)
+    sizes.update(session.exec(statement).all())
+    return sizes
+
+
+def hero_stats(
+    ages: dict[int | None, int], team_sizes: dict[int | None, int], bucket_width: int
+) -> HeroStats:
+    """
+    The statistics of the counts above, the buckets of `bucket_width` years
+    are made from the counts per age so every width shares the same query
+    """
+    counted = {age: count for age, count in ages.items() if age is not None}
+    with_age = sum(counted.values())
+    buckets: dict[int, int] = {}
+    for age, count in counted.items():
+        start = age // bucket_width * bucket_width
+        buckets[start] = buckets.get(start, 0) + count
+    return HeroStats(
+        count=sum(ages.values()),
+        min_age=min(counted, default=None),
+        max_age=max(counted, default=None),
+        avg_age=(
+            sum(age * count for age, count in counted.items()) / with_age
+            if with_age
+            else None
+        ),
+        age_histogram=[
+            AgeBucket(start=start, end=start + bucket_width, count=count)
+            for start, count in sorted(buckets.items())
+        ],
+        teams=[
+            TeamSize(team_id=team_id, heroes=heroes)
+            # the heroes without a team first, like the index has them
+            for team_id, heroes in sorted(
+                team_sizes.items(), key=lambda item: (item[0] is not None, item[0] or 0)
+            )
+        ],
+    )
@@ -0,0 +1,41 @@
+from collections.abc import Iterator
+from typing import Any
+
+from sqlmodel import Session
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+# how many rows are fetched from the cursor and turned into objects at a time
+DEFAULT_PARTITION_SIZE = 1000
+
+
+def stream_partitions(
+    session: Session,
+    statement: Select | SelectOfScalar,
+    *,
+    partition_size: int = DEFAULT_PARTITION_SIZE,
+) -> Iterator[list[Any]]:
+    """
+    Yield the results of `statement` in lists of at most `partition_size` items
+
+    `yield_per` makes the ORM fetch and build objects one partition at a time
+    (it also turns on `stream_results`, a server-side cursor on databases that
+    have them), so memory stays flat no matter how big the table is.
+    Objects are only weakly referenced by the session, the ones from previous
+    partitions are freed as soon as the caller drops them.
+    """
+    statement = statement.execution_options(yield_per=partition_size)
+    results = session.exec(statement)
+    yield from results.partitions()
+
+
+def stream(
+    session: Session,
+    statement: Select | SelectOfScalar,
+    *,
+    partition_size: int = DEFAULT_PARTITION_SIZE,
+) -> Iterator[Any]:
+    """Like `session.exec(statement)` but without ever holding the full result in memory"""
+    for partition in stream_partitions(
+        session, statement, partition_size=partition_size
+    ):
+        yield from partition
@@ -0,0 +1,121 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .async_database import get_session, make_async_engine
+from .database import make_engine
+from .async_main import app
+from .models import AppModel, Hero, Team
+
+
+@pytest.fixture(name="database_path")
+def database_path_fixture(tmp_path):
+    # a file, not "sqlite://": every request of the TestClient can run in a
+    # different event loop, so connections must not be shared between them
+    database_path = tmp_path / "database.db"
+    engine = make_engine(f"sqlite:///{database_path}", profile="default")
+    AppModel.metadata.create_all(engine)
+    engine.dispose()
+    return database_path
+
+
+@pytest.fixture(name="session")
+def session_fixture(database_path):
+    engine = make_engine(f"sqlite:///{database_path}", profile="default")
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="client")
+def client_fixture(database_path):
+    # the pragmas of the tests, foreign keys included, on a connection per session
+    engine = make_async_engine(
+        f"sqlite+aiosqlite:///{database_path}", profile="test", poolclass=NullPool
+    )
+
+    async def get_session_override():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_create_and_read_hero(client: TestClient):
+    team = client.post(
+        "/teams/", json={"name": "Preventers", "headquarters": "Sharp Tower"}
+    ).json()
+    created = client.post(
+        "/heroes/",
+        json={"name": "Rusty-Man", "secret_name": "Tommy Sharp", "team_id": team["id"]},
+    ).json()
+
+    response = client.get(f"/heroes/{created['id']}")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["name"] == "Rusty-Man"
+    assert data["team"]["name"] == "Preventers"
+
+
+def test_read_team_with_heroes(session: Session, client: TestClient):
+    team = Team(name="Preventers", headquarters="Sharp Tower")
+    session.add(Hero(name="Rusty-Man", secret_name="Tommy Sharp", team=team))
+    session.add(Hero(name="Spider-Boy", secret_name="Pedro Parqueador", team=team))
+    session.commit()
+
+    response = client.get(f"/teams/{team.id}")
+    data = response.json()
+
+    assert response.status_code == 200
+    assert sorted(hero["name"] for hero in data["heroes"]) == ["Rusty-Man", "Spider-Boy"]
+
+
+def test_update_and_delete_hero(session: Session, client: TestClient):
+    hero = Hero(name="Deadpond", secret_name="Dive Wilson")
+    session.add(hero)
+    session.commit()
+
+    updated = client.patch(f"/heroes/{hero.id}", json={"name": "Deadpuddle"})
+    deleted = client.delete(f"/heroes/{hero.id}")
+    missing = client.get(f"/heroes/{hero.id}")
+
+    assert updated.json()["name"] == "Deadpuddle"
+    assert deleted.status_code == 200
+    assert missing.status_code == 404
+
+
+def test_delete_team_keeps_heroes(session: Session, client: TestClient):
+    team = Team(name="Wakaland", headquarters="Wakaland Capital City")
+    hero = Hero(name="Black Lion", secret_name="Trevor Challa", team=team)
+    session.add(hero)
+    session.commit()
+
+    response = client.delete(f"/teams/{team.id}")
+    session.refresh(hero)
+
+    assert response.status_code == 200
+    assert hero.team_id is None
+
+
+def test_writes_rejected_by_the_database(client: TestClient):
+    hero = client.post("/heroes/", json={"name": "Deadpond", "secret_name": "?"}).json()
+
+    created = client.post("/heroes/", json={"name": "X", "secret_name": "?", "team_id": 999})
+    updated = client.patch(f"/heroes/{hero['id']}", json={"team_id": 999})
+
+    assert created.status_code == updated.status_code == 422
+    assert "FOREIGN KEY" in created.json()["detail"]
+    assert client.get(f"/heroes/{hero['id']}").json()["team"] is None
+    assert len(client.get("/heroes/").json()) == 1
+
+
+def test_read_pages_limits(client: TestClient):
+    for url in ["/heroes/", "/teams/"]:
+        for limit in (0, -1, 101):
+            assert client.get(url, params={"limit": limit}).status_code == 422